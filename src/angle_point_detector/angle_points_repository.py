@@ -1,13 +1,25 @@
 import logging
 import math
+import uuid
 
+import numpy as np
 from neo4j import GraphDatabase
 
 logging.basicConfig(level=logging.INFO)
 
 class AnglePointsRepository:
-    def __init__(self, uri, user, password):
+    # Namespace of the angle point ids derived from the image and the pair of lines
+    ANGLE_POINT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_OID, "AnglePoint")
+
+    # Every pair of lines intersects as infinite lines
+    INTERSECTION_MODE_LINE = "line"
+    # Only crossing segments, extended by intersection_extension pixels at both ends, intersect
+    INTERSECTION_MODE_SEGMENT = "segment"
+
+    def __init__(self, uri, user, password, intersection_mode=INTERSECTION_MODE_LINE, intersection_extension=10):
         logging.info("Initializing AnglePointsRepository")
+        self.intersection_mode = intersection_mode
+        self.intersection_extension = intersection_extension
         try:
             self.driver = GraphDatabase.driver(uri, auth=(user, password))
             logging.info("Database connection established")
@@ -25,18 +37,20 @@ class AnglePointsRepository:
             raise
 
     @staticmethod
-    def fetch_line_data(session):
+    def fetch_line_data(tx, image_id):
+        """Returns the ids and the (n, 4) coordinates of the lines of the image"""
         query = """
-        MATCH (line1:Line)--(:Location)--(coords1:Coordinates),
-            (line2:Line)--(:Location)--(coords2:Coordinates)
-        WHERE NOT EXISTS {
-            MATCH (line1)-[*]-(:Line)
-        }
-        AND line1.id <> line2.id
-        RETURN line1, coords1, line2, coords2
+        MATCH (line:Line {image_id: $image_id})-[:HAS_LOCATION]->(:Location)-[:HAS_COORDINATES]->(coords:Coordinates)
+        RETURN line.id AS id, coords.x1 AS x1, coords.y1 AS y1, coords.x2 AS x2, coords.y2 AS y2
+        ORDER BY id
         """
-        return session.run(query)
-    
+        records = list(tx.run(query, image_id=image_id))
+        line_ids = [record["id"] for record in records]
+        coords = np.array(
+            [[record["x1"], record["y1"], record["x2"], record["y2"]] for record in records], dtype=np.float64
+        ).reshape(-1, 4)
+        return line_ids, coords
+
     @staticmethod
     def calculate_angle(line1, line2):
         dx1 = line1[2] - line1[0]
@@ -76,50 +90,189 @@ class AnglePointsRepository:
         return [int(px), int(py)]
     
     @staticmethod
-    def create_angle_points(session, intersection_data, image_id):
+    def calculate_angles(lines1, lines2):
+        """Vectorized calculate_angle for (n, 4) arrays of line pairs"""
+        angles1 = np.arctan2(lines1[:, 3] - lines1[:, 1], lines1[:, 2] - lines1[:, 0])
+        angles2 = np.arctan2(lines2[:, 3] - lines2[:, 1], lines2[:, 2] - lines2[:, 0])
+        angles = np.abs(angles1 - angles2)
+
+        angles = np.where(angles > math.pi, 2 * math.pi - angles, angles)
+        # Ensuring the angle is always the interior angle
+        angles = np.where(angles > math.pi / 2, math.pi - angles, angles)
+
+        return np.degrees(angles)
+
+    @staticmethod
+    def line_intersections(coords):
+        """Vectorized line_intersection for every pair of the (n, 4) lines.
+
+        Returns:
+            indices of the first and the second line of the intersecting pairs, (m, 2) intersection points
+        """
+        first, second = np.triu_indices(len(coords), k=1)
+        px, py, intersecting = AnglePointsRepository._intersect(coords[first], coords[second])
+        first, second = first[intersecting], second[intersecting]
+        px, py = px[intersecting], py[intersecting]
+
+        # Truncated towards zero as int() does in line_intersection
+        points = np.trunc(np.stack([px, py], axis=1)).astype(np.int64)
+        return first, second, points
+
+    @staticmethod
+    def segment_intersections(coords, extension):
+        """Intersections of the (n, 4) segments extended by extension pixels at both ends.
+        Only the pairs with overlapping bounding boxes are intersected, so the cost follows
+        the number of nearby segments instead of all pairs. Returns the same as line_intersections."""
+        first, second = AnglePointsRepository._get_overlapping_boxes(coords, extension)
+        lines1, lines2 = coords[first], coords[second]
+        px, py, intersecting = AnglePointsRepository._intersect(lines1, lines2)
+
+        # The point has to lie on both extended segments
+        for lines in (lines1, lines2):
+            dx = lines[:, 2] - lines[:, 0]
+            dy = lines[:, 3] - lines[:, 1]
+            lengths = np.hypot(dx, dy)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                along = ((px - lines[:, 0]) * dx + (py - lines[:, 1]) * dy) / lengths
+            intersecting &= (along >= -extension) & (along <= lengths + extension)
+
+        first, second = first[intersecting], second[intersecting]
+        points = np.trunc(np.stack([px[intersecting], py[intersecting]], axis=1)).astype(np.int64)
+        return first, second, points
+
+    @staticmethod
+    def _get_overlapping_boxes(coords, extension):
+        """Sort-and-sweep over the bounding boxes extended by extension pixels.
+        Returns the index pairs (i < j) of the boxes overlapping on both axes."""
+        min_x = np.minimum(coords[:, 0], coords[:, 2]) - extension
+        max_x = np.maximum(coords[:, 0], coords[:, 2]) + extension
+        min_y = np.minimum(coords[:, 1], coords[:, 3]) - extension
+        max_y = np.maximum(coords[:, 1], coords[:, 3]) + extension
+
+        order = np.argsort(min_x, kind="stable")
+        sorted_min_x = min_x[order]
+        # Every box overlaps on x with the following boxes which start before it ends
+        range_ends = np.searchsorted(sorted_min_x, max_x[order], side="right")
+        range_starts = np.arange(len(order)) + 1
+        range_counts = np.maximum(range_ends - range_starts, 0)
+
+        positions = np.repeat(np.arange(len(order)), range_counts)
+        other_positions = (
+            np.repeat(range_starts - np.cumsum(range_counts) + range_counts, range_counts) + np.arange(range_counts.sum())
+        )
+        boxes, other_boxes = order[positions], order[other_positions]
+
+        overlapping = (min_y[boxes] <= max_y[other_boxes]) & (min_y[other_boxes] <= max_y[boxes])
+        first = np.minimum(boxes[overlapping], other_boxes[overlapping])
+        second = np.maximum(boxes[overlapping], other_boxes[overlapping])
+
+        # Same pair order as line_intersections
+        pair_order = np.lexsort((second, first))
+        return first[pair_order], second[pair_order]
+
+    @staticmethod
+    def _intersect(lines1, lines2):
+        """Intersection points of the infinite lines of the (n, 4) pairs and the mask of the non-parallel pairs"""
+        x1, y1, x2, y2 = lines1.T
+        x3, y3, x4, y4 = lines2.T
+
+        denominators = (x1 - x2) * (y3 - y4) - (y1 - y2) * (x3 - x4)
+        # Parallel lines don't intersect, their points are dropped by the callers
+        intersecting = denominators != 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            px = ((x1 * y2 - y1 * x2) * (x3 - x4) - (x1 - x2) * (x3 * y4 - y3 * x4)) / denominators
+            py = ((x1 * y2 - y1 * x2) * (y3 - y4) - (y1 - y2) * (x3 * y4 - y3 * x4)) / denominators
+        return px, py, intersecting
+
+    @staticmethod
+    def create_angle_values(tx, angles):
+        """Creates the missing AnglePointAngle nodes of the angles before the angle points are written.
+        The nodes are shared between images, so they are created in their own short transaction
+        and the existing ones are only matched, the angle points of the image then MATCH them all."""
+        # Sorted, so parallel workers creating the same values lock them in the same order
+        query = """
+        UNWIND $angles AS angle
+        OPTIONAL MATCH (existing:AnglePointAngle {angle: angle})
+        WITH angle, existing
+        WHERE existing IS NULL
+        MERGE (:AnglePointAngle {angle: angle})
+        """
+        tx.run(query, angles=sorted(set(angles)))
+
+    @staticmethod
+    def create_angle_points(tx, intersection_data, image_id):
+        # Angle points and their coordinates belong to the image, only the angle values are shared between images.
+        # Every MERGE is keyed by deterministic values, so a retried or repeated write creates nothing new.
+        # The angle values are created by create_angle_values beforehand and only matched here.
         query = """
         UNWIND $intersection_data AS data
-        MERGE (apCoords:AnglePointCoordinates {x: data.intersection.x, y: data.intersection.y})
-        MERGE (ap:AnglePoint {id: randomUUID(), image_id: $image_id})
+        MERGE (ap:AnglePoint {id: data.id})
+        ON CREATE SET ap.image_id = $image_id
+        MERGE (apCoords:AnglePointCoordinates {image_id: $image_id, x: data.intersection.x, y: data.intersection.y})
         MERGE (ap)-[:HAS_COORDINATES]->(apCoords)
-        MERGE (apAngle:AnglePointAngle {angle: data.angle})
+        WITH ap, data
+        MATCH (apAngle:AnglePointAngle {angle: data.angle})
         MERGE (ap)-[:HAS_ANGLE]->(apAngle)
         
         WITH ap, data
-        MATCH (line1:Line {id: data.line1_id})
-        MATCH (line2:Line {id: data.line2_id})
+        MATCH (line1:Line {id: data.line1_id, image_id: $image_id})
+        MATCH (line2:Line {id: data.line2_id, image_id: $image_id})
         MERGE (line1)-[:HAS_ANGLE_POINT]->(ap)
         MERGE (line2)-[:HAS_ANGLE_POINT]->(ap)
         """
-        session.run(query, intersection_data=intersection_data, image_id=image_id)
-        
-    def detect_angle_points(self, image_id):
-        logging.info("Creating angle points")
+        tx.run(query, intersection_data=intersection_data, image_id=image_id)
+
+    @staticmethod
+    def get_angle_point_id(image_id, line1_id, line2_id):
+        line1_id, line2_id = sorted([line1_id, line2_id])
+        return str(uuid.uuid5(AnglePointsRepository.ANGLE_POINT_NAMESPACE, f"{image_id}/{line1_id}/{line2_id}"))
+
+    @staticmethod
+    def get_intersection_data(
+        image_id, line_ids, coords, intersection_mode=INTERSECTION_MODE_LINE, intersection_extension=10
+    ):
+        """Returns the angle points of the (n, 4) lines for create_angle_points, without a database connection"""
+        if intersection_mode == AnglePointsRepository.INTERSECTION_MODE_SEGMENT:
+            first, second, points = AnglePointsRepository.segment_intersections(coords, intersection_extension)
+        else:
+            first, second, points = AnglePointsRepository.line_intersections(coords)
+        angles = AnglePointsRepository.calculate_angles(coords[first], coords[second])
+
+        intersection_data = [
+            {
+                'id': AnglePointsRepository.get_angle_point_id(image_id, line_ids[i], line_ids[j]),
+                'line1_id': line_ids[i],
+                'line2_id': line_ids[j],
+                'intersection': {'x': int(x), 'y': int(y)},
+                'angle': float(angle),
+            }
+            for i, j, (x, y), angle in zip(first.tolist(), second.tolist(), points.tolist(), angles.tolist())
+        ]
+        # Parallel workers connect the shared angle nodes in the same order, so they wait instead of deadlocking
+        intersection_data.sort(key=lambda data: (data['angle'], data['id']))
+        return intersection_data
+
+    def detect_angle_points(self, image_id, lines=None):
+        """Creates the angle points of the image
+
+        Args:
+            image_id: id of the image
+            lines: [x1, y1, x2, y2] of the lines handed off by line_detector, read from Neo4j when None
+        """
+        logging.info(f"Creating angle points for image {image_id}")
         with self.driver.session() as session:
-            lines_result = AnglePointsRepository.fetch_line_data(session)
-            intersection_data = []
-            compared_lines = set()
-
-            for record in lines_result:
-                line1_id = record['line1']['id']
-                line2_id = record['line2']['id']
-                if (line1_id, line2_id) in compared_lines or (line2_id, line1_id) in compared_lines:
-                    continue
-                compared_lines.add((line1_id, line2_id))
-                
-                line1_coords = (record['coords1']['x1'], record['coords1']['y1'], record['coords1']['x2'], record['coords1']['y2'])
-                line2_coords = (record['coords2']['x1'], record['coords2']['y1'], record['coords2']['x2'], record['coords2']['y2'])
-                logging.info(f"Checking line intersection between {line1_coords} and {line2_coords}")
-                intersection = AnglePointsRepository.line_intersection(line1_coords, line2_coords)
-
-                if intersection:
-                    angle = AnglePointsRepository.calculate_angle(line1_coords, line2_coords)
-                    intersection_data.append({
-                        'line1_id': record['line1']['id'],
-                        'line2_id': record['line2']['id'],
-                        'intersection': {'x': intersection[0], 'y': intersection[1]},
-                        'angle': angle
-                    })
-
-            AnglePointsRepository.create_angle_points(session, intersection_data, image_id)
-            
\ No newline at end of file
+            if lines is None:
+                line_ids, coords = session.execute_read(AnglePointsRepository.fetch_line_data, image_id)
+            else:
+                # The id of a handed off line is its index
+                line_ids = list(range(len(lines)))
+                coords = np.array(lines, dtype=np.float64).reshape(-1, 4)
+            intersection_data = AnglePointsRepository.get_intersection_data(
+                image_id, line_ids, coords, self.intersection_mode, self.intersection_extension
+            )
+
+            logging.info(f"Found {len(intersection_data)} line intersections for {len(line_ids)} lines")
+            session.execute_write(
+                AnglePointsRepository.create_angle_values, [data['angle'] for data in intersection_data]
+            )
+            session.execute_write(AnglePointsRepository.create_angle_points, intersection_data, image_id)
@@ -1,10 +1,13 @@
 """Generic Nuclio Handler Template"""
-import requests
 import traceback
 from nuclio_sdk import Event
 from angle_points_repository import AnglePointsRepository
 from pydantic_settings import BaseSettings
 
+from downstream_dispatcher import DownstreamDispatcher
+from schema_bootstrap import bootstrap_schema
+from stage_payload import LINES, parse_stage_payload
+
 HANDLER_NAME = "angle_point_detector"
 
 
@@ -15,6 +18,16 @@ class Settings(BaseSettings):
     neo4j_user: str
     neo4j_pass: str
     next_nuclio: str = ""
+    # Timeout of the next function calls in seconds
+    next_nuclio_timeout: float = 600
+    # Don't wait for the responses of the next functions
+    next_nuclio_fire_and_forget: bool = False
+    next_nuclio_max_in_flight: int = 16
+    # Create the missing indexes and constraints of the graph database on start
+    schema_bootstrap: bool = True
+    # "line" intersects every pair of lines, "segment" only the segments crossing within intersection_extension pixels
+    intersection_mode: str = "line"
+    intersection_extension: float = 10
 
 
 def init_context(context):
@@ -29,11 +42,28 @@ def init_context(context):
     )
 
     angle_points_repository = AnglePointsRepository(
-        Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass
+        Settings().neo4j_dsn,
+        Settings().neo4j_user,
+        Settings().neo4j_pass,
+        intersection_mode=Settings().intersection_mode,
+        intersection_extension=Settings().intersection_extension,
     )
     setattr(context.user_data, "angle_points_repository", angle_points_repository)
 
+    if Settings().schema_bootstrap:
+        bootstrap_schema(Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass)
+
     setattr(context.user_data, "next_nuclio", Settings().next_nuclio)
+    setattr(
+        context.user_data,
+        "downstream_dispatcher",
+        DownstreamDispatcher(
+            Settings().next_nuclio,
+            timeout=Settings().next_nuclio_timeout,
+            fire_and_forget=Settings().next_nuclio_fire_and_forget,
+            max_in_flight=Settings().next_nuclio_max_in_flight,
+        ),
+    )
 
 
 def http_handler(context, event):
@@ -42,25 +72,17 @@ def http_handler(context, event):
         image_id = event.body
         image_id = image_id.decode("utf-8") if isinstance(image_id, bytes) else image_id
 
-        context.user_data.angle_points_repository.detect_angle_points(image_id)
+        # A batch of images arrives as a list and is forwarded as is, with the lines handed off by line_detector
+        for image_id_item, structures in parse_stage_payload(image_id):
+            context.user_data.angle_points_repository.detect_angle_points(image_id_item, structures.get(LINES))
 
         context.logger.info_with(
             f"Processed request successfully", handler=HANDLER_NAME
         )
 
-        next_functions_str = context.user_data.next_nuclio
-
-        if next_functions_str:
-            next_nuclio = next_functions_str.split(";")
-            context.logger.debug_with(
-                f"Next functions: {next_nuclio}", handler=HANDLER_NAME
-            )
-
-            if len(next_nuclio) > 0:
-                for func in next_nuclio:
-                    context.logger.info_with(f"Calling {func}", handler=HANDLER_NAME)
-                    response = requests.post(func, json=str(image_id))
-                    context.logger.info_with(f"Response: {response.status_code}", handler=HANDLER_NAME)
+        next_payload = image_id if isinstance(image_id, (list, dict)) else str(image_id)
+        for func, status_code in context.user_data.downstream_dispatcher.dispatch(next_payload):
+            context.logger.info_with(f"Response from {func}: {status_code}", handler=HANDLER_NAME)
 
         # Responding to the HTTP request
         context.Response(
@@ -0,0 +1,47 @@
+"""Payload passed from a pipeline stage to the next one.
+
+Without the handoff a stage forwards only the image id and the next stage reads what it
+needs from Neo4j. With the handoff the image id is forwarded together with the structures
+the stage has computed, so the next stage can use them instead of reading them back:
+
+    {"image_id": "...", "lines": [[x1, y1, x2, y2], ...]}
+
+A batch of images is forwarded as a list of such payloads. The structures are optional,
+every stage falls back to Neo4j for the ones it didn't receive.
+"""
+
+# Coordinates of the lines of the image as [x1, y1, x2, y2], the index of a line is its id
+LINES = "lines"
+
+
+def build_stage_payload(image_id, **structures):
+    """Returns the payload of one image, structures which are None are left out"""
+    payload = {"image_id": str(image_id)}
+    payload.update({name: value for name, value in structures.items() if value is not None})
+    return payload
+
+
+def parse_stage_payload(body):
+    """Returns the list of (image_id, structures) of a request body.
+
+    Args:
+        body: image id, payload built by build_stage_payload or a list of them,
+            structures are an empty dict for a plain image id
+    """
+    body = body.decode("utf-8") if isinstance(body, bytes) else body
+    items = body if isinstance(body, list) else [body]
+
+    images = []
+    for item in items:
+        if isinstance(item, dict):
+            structures = {name: value for name, value in item.items() if name != "image_id"}
+            images.append((str(item["image_id"]), structures))
+        else:
+            images.append((str(item), {}))
+    return images
+
+
+def get_next_payload(body, payloads):
+    """Returns the payloads in the same shape as the request body, a list only for a batch"""
+    body = body.decode("utf-8") if isinstance(body, bytes) else body
+    return payloads if isinstance(body, list) else payloads[0]
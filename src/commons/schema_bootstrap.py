@@ -0,0 +1,144 @@
+import argparse
+import logging
+import os
+import sys
+
+from neo4j import GraphDatabase
+from neo4j.exceptions import Neo4jError
+
+logging.basicConfig(level=logging.INFO)
+
+
+class SchemaBootstrap:
+    """Creates the indexes and constraints of the properties the functions look nodes up by.
+    Every statement is idempotent, so all functions can run it when they start."""
+
+    # (label, properties) of the nodes matched or merged by the pipeline
+    RANGE_INDEXES = [
+        ("Line", ("image_id",)),
+        ("Line", ("id",)),
+        ("AnglePoint", ("image_id",)),
+        ("AnglePointCoordinates", ("image_id", "x", "y")),
+        ("Vector", ("image_id",)),
+        ("Vector", ("image_id", "line_id")),
+        ("VectorAngle", ("value",)),
+        ("VectorMagnitude", ("value",)),
+        ("VectorCoordinates", ("x1", "y1", "x2", "y2")),
+        ("VectorValue", ("x", "y")),
+        ("StructuralElements", ("vectorsCount", "anglePointsCount")),
+        ("StructuralElementsSketch", ("sketch_id",)),
+    ]
+    # (label, property) of the ids, the uniqueness constraints come with their own range indexes
+    UNIQUE_CONSTRAINTS = [
+        ("AnglePoint", "id"),
+        # Angle values are created up front by parallel workers, so duplicates are rejected
+        ("AnglePointAngle", "angle"),
+        ("Vector", "vector_id"),
+        # Value nodes shared by all images, merged by parallel contour_analysis workers
+        ("VerticalVectorHalfPlane", "vertical_plane"),
+        ("HorizontalVectorHalfPlane", "horizontal_plane"),
+        ("Quadrant", "quadrant"),
+        ("VectDirection", "direction"),
+        ("CriticalPoint", "reason"),
+    ]
+
+    def __init__(self, uri, user, password):
+        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+
+    def close(self):
+        self.driver.close()
+
+    def create_schema(self):
+        """Creates the missing indexes and constraints, returns the number of the failed statements"""
+        failed = 0
+        with self.driver.session() as session:
+            for label, property_name in SchemaBootstrap.UNIQUE_CONSTRAINTS:
+                query = (
+                    f"CREATE CONSTRAINT {SchemaBootstrap.get_schema_name(label, (property_name,))} IF NOT EXISTS "
+                    f"FOR (n:{label}) REQUIRE n.{property_name} IS UNIQUE"
+                )
+                failed += not SchemaBootstrap._run_schema_query(session, query)
+
+            for label, properties in SchemaBootstrap.RANGE_INDEXES:
+                query = (
+                    f"CREATE INDEX {SchemaBootstrap.get_schema_name(label, properties)} IF NOT EXISTS "
+                    f"FOR (n:{label}) ON ({', '.join(f'n.{property_name}' for property_name in properties)})"
+                )
+                failed += not SchemaBootstrap._run_schema_query(session, query)
+        return failed
+
+    def get_missing_indexes(self):
+        """Returns the (label, properties) of the expected indexes which don't exist or aren't online yet"""
+        with self.driver.session() as session:
+            records = session.run("SHOW INDEXES YIELD labelsOrTypes, properties, state")
+            online = {
+                (label, tuple(record["properties"]))
+                for record in records
+                if record["state"] == "ONLINE" and record["labelsOrTypes"] and record["properties"]
+                for label in record["labelsOrTypes"]
+            }
+
+        expected = SchemaBootstrap.RANGE_INDEXES + [
+            (label, (property_name,)) for label, property_name in SchemaBootstrap.UNIQUE_CONSTRAINTS
+        ]
+        return [index for index in expected if index not in online]
+
+    @staticmethod
+    def get_schema_name(label, properties):
+        return f"{label.lower()}_{'_'.join(properties).lower()}"
+
+    @staticmethod
+    def _run_schema_query(session, query):
+        try:
+            session.run(query).consume()
+            return True
+        except Neo4jError as e:
+            # Concurrently starting functions may create the same index, and a uniqueness
+            # constraint can't be created while duplicates exist, the report shows what's missing
+            logging.warning(f"Error running schema statement {query}: {e}")
+            return False
+
+
+def bootstrap_schema(uri, user, password):
+    """Creates the schema and logs the missing indexes. Errors are logged, so a function
+    whose database isn't reachable yet still starts. Returns the missing indexes or None on errors."""
+    try:
+        schema_bootstrap = SchemaBootstrap(uri, user, password)
+        try:
+            schema_bootstrap.create_schema()
+            missing_indexes = schema_bootstrap.get_missing_indexes()
+        finally:
+            schema_bootstrap.close()
+    except Exception as e:
+        logging.error(f"Error bootstrapping schema: {e}")
+        return None
+
+    for label, properties in missing_indexes:
+        logging.warning(f"Missing index on :{label}({', '.join(properties)})")
+    if not missing_indexes:
+        logging.info("All indexes are online")
+    return missing_indexes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the indexes and constraints of the graph database")
+    parser.add_argument('--neo4j_dsn', type=str, default=os.environ.get("NEO4J_DSN", "bolt://localhost:7687"))
+    parser.add_argument('--neo4j_user', type=str, default=os.environ.get("NEO4J_USER", "neo4j"))
+    parser.add_argument('--neo4j_pass', type=str, default=os.environ.get("NEO4J_PASS", ""))
+    parser.add_argument('--check', action='store_true', help="Only report the missing indexes")
+
+    args = parser.parse_args()
+
+    schema_bootstrap = SchemaBootstrap(args.neo4j_dsn, args.neo4j_user, args.neo4j_pass)
+    try:
+        if not args.check:
+            schema_bootstrap.create_schema()
+        missing_indexes = schema_bootstrap.get_missing_indexes()
+    finally:
+        schema_bootstrap.close()
+
+    for label, properties in missing_indexes:
+        print(f"Missing index on :{label}({', '.join(properties)})")
+    if missing_indexes:
+        sys.exit(1)
+    print("All indexes are online")
@@ -2,10 +2,18 @@ import logging
 
 from neo4j import GraphDatabase, ManagedTransaction
 
+from count_sketch import CountSketch
+
 
 class ConceptCreationRepository:
-    def __init__(self, uri, user, password):
+    # Labels of the structural elements removed once the concept is created,
+    # the sketches of their counts are removed with them
+    STRUCTURAL_ELEMENT_LABELS = ["Vector", "AnglePoint", "StructuralElementsSketch"]
+
+    def __init__(self, uri, user, password, delete_batch_size=10000):
         logging.info("Initializing ConceptCreationRepository")
+        # Number of nodes deleted in one transaction, keeps the transactions under the memory limit
+        self.delete_batch_size = delete_batch_size
         try:
             self.driver = GraphDatabase.driver(uri, auth=(user, password))
             logging.info("Database connection established")
@@ -27,16 +35,19 @@ class ConceptCreationRepository:
         with self.driver.session() as session:
             session.write_transaction(self._create_concept)
             session.write_transaction(self._link_features_to_concept)
-            session.write_transaction(self._remove_structural_elements)
+        self._remove_structural_elements()
 
     def _create_concept(self, tx: ManagedTransaction):
         """# TODO new idea will be to create the new concept with some hash instead of name.
         This hash will be based on the structural elements and the features of the concept.
         So we can ensure that the concept is unique.
         """
-        vectorsCount, anglePointsCount = (
-            self._count_99_percentile_of_structural_elements(tx)
-        )
+        vectorsCount, anglePointsCount = self._read_99_percentile_of_structural_elements(tx)
+        if vectorsCount is None:
+            # The images were analyzed before contour_analysis recorded the sketches
+            vectorsCount, anglePointsCount = (
+                self._count_99_percentile_of_structural_elements(tx)
+            )
 
         query = """
             MERGE (concept:TriangleConcept)
@@ -50,18 +61,61 @@ class ConceptCreationRepository:
         """Links all the features left from the statistical reduction to the new concept"""
         query = """
             MATCH (n)
-            WHERE NOT (n:StructuralElements OR n:Vector OR n:AnglePoint OR n:TriangleConcept)
+            WHERE NOT (n:StructuralElements OR n:StructuralElementsSketch OR n:Vector OR n:AnglePoint OR n:TriangleConcept)
             MATCH (concept:TriangleConcept)
             MERGE (n)-[:IS_PART_OF_CONCEPT]->(concept)
         """
         tx.run(query)
 
-    def _remove_structural_elements(self, tx: ManagedTransaction):
+    def _remove_structural_elements(self):
+        """Deletes the structural elements label by label, every batch in its own transaction"""
+        with self.driver.session() as session:
+            for label in ConceptCreationRepository.STRUCTURAL_ELEMENT_LABELS:
+                deleted = 0
+                while True:
+                    batch_deleted = session.execute_write(
+                        self._delete_nodes_batch, label, self.delete_batch_size
+                    )
+                    deleted += batch_deleted
+                    if batch_deleted < self.delete_batch_size:
+                        break
+                    logging.info(f"Deleted {deleted} {label} nodes so far")
+                logging.info(f"Deleted {deleted} {label} nodes")
+
+    @staticmethod
+    def _delete_nodes_batch(tx: ManagedTransaction, label: str, batch_size: int) -> int:
+        # Labels can't be parameters
+        query = f"""
+            MATCH (n:{label})
+            WITH n LIMIT $batch_size
+            DETACH DELETE n
+            RETURN count(*) AS deleted
+        """
+        return tx.run(query, batch_size=batch_size).single()["deleted"]
+
+    def _read_99_percentile_of_structural_elements(
+        self, tx: ManagedTransaction
+    ) -> tuple[int, int]:
+        """Merges the sketches recorded by contour_analysis, returns None when there are none"""
         query = """
-            MATCH (vector:Vector), (anglePoint:AnglePoint)
-            DETACH DELETE vector, anglePoint
+            MATCH (sketch:StructuralElementsSketch)
+            RETURN sketch.vectorsCounts AS vectorsCounts, sketch.vectorsFrequencies AS vectorsFrequencies,
+                sketch.anglePointsCounts AS anglePointsCounts, sketch.anglePointsFrequencies AS anglePointsFrequencies
         """
-        tx.run(query)
+        vectors_sketch = CountSketch()
+        angle_points_sketch = CountSketch()
+        for sketch in tx.run(query):
+            vectors_sketch.merge(CountSketch(sketch["vectorsCounts"], sketch["vectorsFrequencies"]))
+            angle_points_sketch.merge(CountSketch(sketch["anglePointsCounts"], sketch["anglePointsFrequencies"]))
+
+        if vectors_sketch.size() == 0:
+            return None, None
+
+        logging.info(
+            f"99th percentile of the vector count: {vectors_sketch.quantile(0.99)}, "
+            f"angle point: {angle_points_sketch.quantile(0.99)} from {vectors_sketch.size()} images"
+        )
+        return vectors_sketch.quantile(0.99), angle_points_sketch.quantile(0.99)
 
     def _count_99_percentile_of_structural_elements(
         self, tx: ManagedTransaction
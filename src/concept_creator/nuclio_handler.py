@@ -1,9 +1,11 @@
 """Generic Nuclio Handler Template"""
 
-import requests
 import traceback
 from pydantic_settings import BaseSettings
 
+from downstream_dispatcher import DownstreamDispatcher
+from schema_bootstrap import bootstrap_schema
+
 from concept_creation_repository import ConceptCreationRepository
 
 HANDLER_NAME = "concept_creator"
@@ -16,6 +18,15 @@ class Settings(BaseSettings):
     neo4j_user: str
     neo4j_pass: str
     next_nuclio: str = ""
+    # Timeout of the next function calls in seconds
+    next_nuclio_timeout: float = 600
+    # Don't wait for the responses of the next functions
+    next_nuclio_fire_and_forget: bool = False
+    next_nuclio_max_in_flight: int = 16
+    # Create the missing indexes and constraints of the graph database on start
+    schema_bootstrap: bool = True
+    # Number of structural elements deleted in one transaction after the concept is created
+    delete_batch_size: int = 10000
 
 
 def init_context(context):
@@ -28,12 +39,28 @@ def init_context(context):
     context.logger.debug_with(
         f"Exporter initializing with:\n{Settings().model_dump()}", handler=HANDLER_NAME
     )
+    if Settings().schema_bootstrap:
+        bootstrap_schema(Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass)
+
     setattr(context.user_data, "next_nuclio", Settings().next_nuclio)
+    setattr(
+        context.user_data,
+        "downstream_dispatcher",
+        DownstreamDispatcher(
+            Settings().next_nuclio,
+            timeout=Settings().next_nuclio_timeout,
+            fire_and_forget=Settings().next_nuclio_fire_and_forget,
+            max_in_flight=Settings().next_nuclio_max_in_flight,
+        ),
+    )
     setattr(
         context.user_data,
         "concept_creation_repository",
         ConceptCreationRepository(
-            Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass
+            Settings().neo4j_dsn,
+            Settings().neo4j_user,
+            Settings().neo4j_pass,
+            delete_batch_size=Settings().delete_batch_size,
         ),
     )
 
@@ -51,18 +78,8 @@ def http_handler(context, event):
             "Processed request successfully", handler=HANDLER_NAME
         )
 
-        next_functions_str = context.user_data.next_nuclio
-
-        if next_functions_str:
-            next_nuclio = next_functions_str.split(";")
-            context.logger.debug_with(
-                f"Next functions: {next_nuclio}", handler=HANDLER_NAME
-            )
-
-            if len(next_nuclio) > 0:
-                for func in next_nuclio:
-                    context.logger.info_with(f"Calling {func}", handler=HANDLER_NAME)
-                    requests.post(func)
+        for func, status_code in context.user_data.downstream_dispatcher.dispatch():
+            context.logger.info_with(f"Response from {func}: {status_code}", handler=HANDLER_NAME)
 
         # Responding to the HTTP request
         context.Response(
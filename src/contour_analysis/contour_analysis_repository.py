@@ -1,7 +1,11 @@
 import logging
+import uuid
 
 from neo4j import GraphDatabase
+from logic.contour_engine import load_contour_graph, walk_contour, write_contour
 from logic.exposition_analyzer import analyze_exposition
+from logic.shared_nodes import load_shared_nodes
+from logic.structural_elements import record_structural_elements
 from logic.contour_traverse import (
     find_starting_point,
     traverse_contour,
@@ -12,8 +16,16 @@ logging.basicConfig(level=logging.DEBUG)
 
 
 class ContourAnalysisRepository:
-    def __init__(self, uri, user, password):
+    # Every step of the traversal reads and writes the graph
+    CONTOUR_ENGINE_CYPHER = "cypher"
+    # The subgraph of the image is read once, traversed in memory and the results are written at once
+    CONTOUR_ENGINE_MEMORY = "memory"
+
+    def __init__(self, uri, user, password, contour_engine=CONTOUR_ENGINE_CYPHER):
         logging.info("Initializing ContourAnalysisRepository")
+        self.contour_engine = contour_engine
+        # Sketch node of the structural element counts written by this process
+        self.sketch_id = str(uuid.uuid4())
         try:
             self.driver = GraphDatabase.driver(uri, auth=(user, password))
             logging.info("Database connection established")
@@ -32,15 +44,44 @@ class ContourAnalysisRepository:
 
     def analyze_contour(self, image_id):
         logging.info("Starting find_and_create_points method")
+        load_shared_nodes(self.driver)
+        try:
+            if self.contour_engine == ContourAnalysisRepository.CONTOUR_ENGINE_MEMORY:
+                return self.analyze_contour_in_memory(image_id)
+
+            with self.driver.session() as session:
+                min_angle_point = session.write_transaction(find_starting_point, image_id)
+
+                result = session.write_transaction(
+                    traverse_contour,
+                    image_id,
+                    min_angle_point,
+                )
+
+                session.write_transaction(analyze_exposition, image_id)
+                logging.debug(f"Result from calculate_and_set_relative_params: {result}")
+                return result
+        finally:
+            # The vectors of the image are counted even if the contour analysis fails
+            self.record_structural_elements(image_id)
+
+    def record_structural_elements(self, image_id):
+        with self.driver.session() as session:
+            session.execute_write(record_structural_elements, image_id, self.sketch_id)
+
+    def analyze_contour_in_memory(self, image_id):
         with self.driver.session() as session:
-            min_angle_point = session.write_transaction(find_starting_point, image_id)
+            graph = session.execute_read(load_contour_graph, image_id)
+            walk = walk_contour(graph)
+            if walk is None:
+                logging.warning(f"No angle points found for image {image_id}")
+                return None
 
-            result = session.write_transaction(
-                traverse_contour,
-                image_id,
-                min_angle_point,
-            )
+            session.execute_write(self._write_contour_and_exposition, walk, graph, image_id)
+            logging.debug(f"Result from walk_contour: {walk}")
+            return walk
 
-            session.write_transaction(analyze_exposition, image_id)
-            logging.debug(f"Result from calculate_and_set_relative_params: {result}")
-            return result
+    @staticmethod
+    def _write_contour_and_exposition(tx, walk, graph, image_id):
+        write_contour(tx, walk)
+        analyze_exposition(tx, image_id, graph.get_vector_angle_points())
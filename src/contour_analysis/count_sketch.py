@@ -0,0 +1,53 @@
+"""Mergeable sketch of per-image counts.
+
+The structural elements of an image are counted in small integers, so the sketch keeps the
+frequency of every distinct count. Its size is bounded by the number of distinct counts, as
+with a t-digest or KLL sketch, but the quantiles are exact. Sketches written by different
+processes are merged by adding the frequencies.
+
+In Neo4j a sketch is stored as two lists of the same length, the counts and their frequencies.
+"""
+
+import math
+
+
+class CountSketch:
+    def __init__(self, counts=None, frequencies=None):
+        self.frequencies = {}
+        for count, frequency in zip(counts or [], frequencies or []):
+            self.add(count, frequency)
+
+    def add(self, count, frequency=1):
+        self.frequencies[int(count)] = self.frequencies.get(int(count), 0) + int(frequency)
+
+    def merge(self, other):
+        for count, frequency in other.frequencies.items():
+            self.add(count, frequency)
+        return self
+
+    def size(self):
+        """Number of the added counts"""
+        return sum(self.frequencies.values())
+
+    def quantile(self, q):
+        """Returns the nearest-rank quantile of the added counts, None if the sketch is empty
+
+        Args:
+            q: quantile between 0 and 1, e.g. 0.99
+        """
+        size = self.size()
+        if size == 0:
+            return None
+
+        rank = max(1, math.ceil(q * size))
+        cumulative = 0
+        for count in sorted(self.frequencies):
+            cumulative += self.frequencies[count]
+            if cumulative >= rank:
+                return count
+        return max(self.frequencies)
+
+    def to_lists(self):
+        """Returns the (counts, frequencies) lists stored in Neo4j"""
+        counts = sorted(self.frequencies)
+        return counts, [self.frequencies[count] for count in counts]
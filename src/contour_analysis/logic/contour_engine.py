@@ -0,0 +1,423 @@
+import logging
+import math
+from collections import defaultdict
+from typing import Union
+
+from neo4j import ManagedTransaction
+
+from logic.helpers import calculate_half_plane_and_quadrant
+from logic.shared_nodes import shared_node_id
+from model.angle_point import AnglePoint
+from model.contour_vector import ContourVector
+from model.contour_walk import ContourWalk
+from model.vector_details import VectorDetails
+
+logging.basicConfig(level=logging.INFO)
+
+
+class ContourGraph:
+    """Vector/AnglePoint subgraph of an image"""
+
+    def __init__(self, angle_points: list[AnglePoint], vectors: list[ContourVector]):
+        self.angle_points: dict[str, AnglePoint] = {angle_point.id: angle_point for angle_point in angle_points}
+        self.vectors: dict[str, ContourVector] = {vector.uuid: vector for vector in vectors}
+        self.angle_point_vectors: dict[str, list[str]] = defaultdict(list)
+        for vector in sorted(vectors, key=lambda vector: vector.uuid):
+            for angle_point_id in vector.angle_point_ids:
+                self.angle_point_vectors[angle_point_id].append(vector.uuid)
+
+    def get_vector_angle_points(self) -> list[tuple[str, str]]:
+        """(vector_id, angle_point_id) pairs of the graph"""
+        return [
+            (vector.uuid, angle_point_id)
+            for vector in self.vectors.values()
+            for angle_point_id in vector.angle_point_ids
+        ]
+
+
+def build_contour_graph(angle_points: list[dict], vectors: list[dict]) -> ContourGraph:
+    """
+    Builds the contour graph from the rows of load_contour_graph or from the vectors built in memory.
+
+    Args:
+        angle_points (list[dict]): {id, x, y} of the angle points.
+        vectors (list[dict]): {vector_id, angle_point_ids, segments} with {x1, y1, x2, y2, magnitude} segments.
+    Returns:
+        ContourGraph: The contour graph.
+    """
+    return ContourGraph(
+        [AnglePoint(x=row["x"], y=row["y"], id=row["id"]) for row in angle_points],
+        [
+            ContourVector(
+                uuid=row["vector_id"],
+                angle_point_ids=list(row["angle_point_ids"]),
+                segments=[
+                    VectorDetails(row["vector_id"], segment["x1"], segment["y1"], segment["x2"], segment["y2"])
+                    for segment in row["segments"]
+                ],
+                magnitude=max((segment["magnitude"] for segment in row["segments"]), default=None),
+            )
+            for row in vectors
+        ],
+    )
+
+
+def load_contour_graph(tx: ManagedTransaction, image_id: str) -> ContourGraph:
+    """
+    Loads the angle points and the vectors of the image.
+
+    Args:
+        tx (ManagedTransaction): The managed transaction object.
+        image_id (str): The ID of the image.
+    Returns:
+        ContourGraph: The contour graph of the image.
+    """
+    logging.info(f"Loading contour graph for image {image_id}")
+
+    angle_points_query = """
+        MATCH (apLoc:AnglePointCoordinates)--(ap:AnglePoint {image_id: $image_id})
+        RETURN ap.id AS id, apLoc.x AS x, apLoc.y AS y
+    """
+    angle_points = [record.data() for record in tx.run(angle_points_query, image_id=image_id)]
+
+    vectors_query = """
+        MATCH (v:Vector {image_id: $image_id})
+        OPTIONAL MATCH (v)-[:HAS_ANGLE_POINT]->(ap:AnglePoint)
+        WITH v, collect(DISTINCT ap.id) AS angle_point_ids
+        OPTIONAL MATCH (v)-[:HAS_VECTOR_COORDINATES]->(coords:VectorCoordinates)
+        WITH v, angle_point_ids, collect(DISTINCT coords) AS coordinates
+        OPTIONAL MATCH (v)-[:HAS_MAGNITUDE]->(magnitude:VectorMagnitude)
+        WITH v, angle_point_ids, coordinates, max(magnitude.value) AS magnitude
+        RETURN v.vector_id AS vector_id, angle_point_ids, magnitude,
+            [coords IN coordinates | {x1: coords.x1, y1: coords.y1, x2: coords.x2, y2: coords.y2}] AS segments
+    """
+    vectors = []
+    for record in tx.run(vectors_query, image_id=image_id):
+        vector = record.data()
+        # Magnitudes are nodes of the vector, not of its coordinates
+        vector["segments"] = [dict(segment, magnitude=vector["magnitude"]) for segment in vector["segments"]]
+        vectors.append(vector)
+
+    return build_contour_graph(angle_points, vectors)
+
+
+def walk_contour(graph: ContourGraph) -> Union[ContourWalk, None]:
+    """
+    Traverses the contour as contour_traverse does, but over the graph in memory.
+
+    The traversal queries leave the choice between several next vectors to the database.
+    Here the choice is deterministic: unvisited vectors first, then the nearest next angle point.
+
+    Args:
+        graph (ContourGraph): The contour graph of the image.
+    Returns:
+        ContourWalk: The results to write, None if the image has no angle points.
+    """
+    if not graph.angle_points:
+        return None
+
+    min_angle_point = min(graph.angle_points.values(), key=lambda ap: (ap.y, ap.x, ap.id))
+    first_vector = _get_first_vector(graph, min_angle_point)
+    walk = ContourWalk(min_angle_point.id, first_vector.uuid)
+
+    processed_angle_points: list[AnglePoint] = [min_angle_point]
+    processed_vectors: list[VectorDetails] = []
+    # The traversal queries read the first value, quadrant and direction connected to a vector
+    vector_values: dict[str, tuple] = {}
+    vector_quadrants: dict[str, int] = {}
+    vector_directions: dict[str, str] = {}
+
+    while True:
+        processed_vector_ids = [v.uuid for v in processed_vectors]
+
+        if len(processed_vectors) == 0:
+            current_vector, current_angle_point = first_vector, min_angle_point
+        else:
+            result = _get_next_vector(graph, processed_vectors[-1].uuid, processed_angle_points[-1], processed_vector_ids)
+            if result is None:
+                logging.info("No more vectors to process")
+                break
+            current_vector, current_angle_point = result
+
+        value = _get_vector_value(current_vector, current_angle_point)
+        horizontal_plane, vertical_plane, quadrant = calculate_half_plane_and_quadrant(*value)
+        walk.vector_values.append({
+            "vector_id": current_vector.uuid,
+            "x": value[0],
+            "y": value[1],
+            "horizontal_plane": horizontal_plane,
+            "vertical_plane": vertical_plane,
+            "quadrant": quadrant,
+        })
+        vector_values.setdefault(current_vector.uuid, value)
+        vector_quadrants.setdefault(current_vector.uuid, quadrant)
+
+        if len(processed_vectors) > 0:
+            last_vector_id = processed_vectors[-1].uuid
+            vector_ids = {"vector1_id": last_vector_id, "vector2_id": current_vector.uuid}
+
+            if vector_quadrants[last_vector_id] != vector_quadrants[current_vector.uuid]:
+                walk.quadrant_changes.append(vector_ids)
+
+            if _get_shared_angle_points(graph, last_vector_id, current_vector.uuid):
+                last_direction = vector_directions.get(last_vector_id)
+                current_direction = _calculate_direction(
+                    vector_values[last_vector_id], vector_values[current_vector.uuid]
+                )
+                walk.directions.append(dict(vector_ids, direction=current_direction))
+                vector_directions.setdefault(last_vector_id, current_direction)
+                vector_directions.setdefault(current_vector.uuid, current_direction)
+
+                if last_direction and last_direction != current_direction:
+                    walk.direction_changes.append(vector_ids)
+
+            label = _compare_magnitudes(graph.vectors[last_vector_id], graph.vectors[current_vector.uuid])
+            walk.magnitude_comparisons.append(dict(vector_ids, label=label))
+
+        processed_vectors.append(current_vector)
+        processed_angle_points.append(current_angle_point)
+
+        if current_vector.uuid in processed_vector_ids:
+            logging.info(f"Last vector {current_vector.uuid} processed")
+            break
+
+    return walk
+
+
+def write_contour(tx: ManagedTransaction, walk: ContourWalk) -> None:
+    """
+    Writes the results of the traversal with a constant number of statements.
+    The shared nodes are matched by their element ids, load_shared_nodes has to be called before.
+
+    Args:
+        tx (ManagedTransaction): The managed transaction object.
+        walk (ContourWalk): The results of walk_contour.
+    Returns:
+        None
+    """
+    query = """
+        MATCH (n:AnglePoint {id: $first_point_id})
+        MATCH (criticalPoint) WHERE elementId(criticalPoint) = $first_point_cp_id
+        WITH n, criticalPoint
+        WHERE NOT EXISTS { (criticalPoint)<-[:IS_CRITICAL_POINT]-(n) }
+        CREATE (criticalPoint)<-[:IS_CRITICAL_POINT]-(n)
+        WITH count(*) AS firstPoints
+        MATCH (v:Vector {vector_id: $first_vector_id})
+        MATCH (cp) WHERE elementId(cp) = $first_line_cp_id
+        WITH v, cp
+        WHERE NOT EXISTS { (cp)<-[:IS_CRITICAL_POINT]-(v) }
+        CREATE (cp)<-[:IS_CRITICAL_POINT]-(v)
+    """
+    tx.run(
+        query,
+        first_point_id=walk.first_point_id,
+        first_vector_id=walk.first_vector_id,
+        first_point_cp_id=shared_node_id("CriticalPoint", reason="First point"),
+        first_line_cp_id=shared_node_id("CriticalPoint", reason="First Line"),
+    )
+
+    query = """
+        UNWIND $vector_values AS value
+        MATCH (vector:Vector {vector_id: value.vector_id})
+        MERGE (vValue:VectorValue {x: value.x, y: value.y})
+        MERGE (vector)-[:HAS_VECTOR_VALUE]->(vValue)
+        WITH vector, value
+        MATCH (vertical) WHERE elementId(vertical) = value.vertical_id
+        MATCH (horizontal) WHERE elementId(horizontal) = value.horizontal_id
+        MATCH (quadrant) WHERE elementId(quadrant) = value.quadrant_id
+        CALL {
+            WITH vector, vertical
+            WITH vector, vertical
+            WHERE NOT EXISTS { (vector)-[:HAS_VERTICAL_VECTOR_HALF_PLANE]->(vertical) }
+            CREATE (vector)-[:HAS_VERTICAL_VECTOR_HALF_PLANE]->(vertical)
+        }
+        CALL {
+            WITH vector, horizontal
+            WITH vector, horizontal
+            WHERE NOT EXISTS { (vector)-[:HAS_HORIZONTAL_VECTOR_HALF_PLANE]->(horizontal) }
+            CREATE (vector)-[:HAS_HORIZONTAL_VECTOR_HALF_PLANE]->(horizontal)
+        }
+        CALL {
+            WITH vector, quadrant
+            WITH vector, quadrant
+            WHERE NOT EXISTS { (vector)-[:HAS_QUADRANT]->(quadrant) }
+            CREATE (vector)-[:HAS_QUADRANT]->(quadrant)
+        }
+    """
+    tx.run(
+        query,
+        vector_values=[
+            dict(
+                value,
+                vertical_id=shared_node_id("VerticalVectorHalfPlane", vertical_plane=value["vertical_plane"]),
+                horizontal_id=shared_node_id("HorizontalVectorHalfPlane", horizontal_plane=value["horizontal_plane"]),
+                quadrant_id=shared_node_id("Quadrant", quadrant=value["quadrant"]),
+            )
+            for value in _get_unique_rows(walk.vector_values)
+        ],
+    )
+
+    query = """
+        UNWIND $quadrant_changes AS change
+        MATCH (v1:Vector {vector_id: change.vector1_id})
+        MATCH (v2:Vector {vector_id: change.vector2_id})
+        MATCH (quad_change) WHERE elementId(quad_change) = $quad_change_id
+        MATCH (cp) WHERE elementId(cp) = $cp_id
+        CALL {
+            WITH v1, v2, quad_change
+            WITH v1, v2, quad_change
+            WHERE NOT EXISTS { (v1)-[:HAS_QUADRANT_CHANGE]->(quad_change)-[:HAS_QUADRANT_CHANGE]->(v2) }
+            CREATE (v1)-[:HAS_QUADRANT_CHANGE]->(quad_change)-[:HAS_QUADRANT_CHANGE]->(v2)
+        }
+        WITH DISTINCT v1, v2, cp
+        MATCH (v1)--(ap:AnglePoint)--(v2)
+        WITH DISTINCT ap, cp
+        WHERE NOT EXISTS { (ap)-[:IS_CRITICAL_POINT]->(cp) }
+        CREATE (ap)-[:IS_CRITICAL_POINT]->(cp)
+    """
+    tx.run(
+        query,
+        quadrant_changes=_get_unique_rows(walk.quadrant_changes),
+        quad_change_id=shared_node_id("QuadrantChange"),
+        cp_id=shared_node_id("CriticalPoint", reason="Quadrant Change"),
+    )
+
+    query = """
+        UNWIND $directions AS direction
+        MATCH (v1:Vector {vector_id: direction.vector1_id})
+        MATCH (v2:Vector {vector_id: direction.vector2_id})
+        MATCH (vd) WHERE elementId(vd) = direction.direction_id
+        CALL {
+            WITH v1, v2, vd
+            WITH v1, v2, vd
+            WHERE NOT EXISTS { (v1)-[:HAS_DIRECTION]->(vd)-[:HAS_DIRECTION]->(v2) }
+            CREATE (v1)-[:HAS_DIRECTION]->(vd)-[:HAS_DIRECTION]->(v2)
+        }
+    """
+    tx.run(
+        query,
+        directions=[
+            dict(direction, direction_id=shared_node_id("VectDirection", direction=direction["direction"]))
+            for direction in _get_unique_rows(walk.directions)
+        ],
+    )
+
+    query = """
+        UNWIND $direction_changes AS change
+        MATCH (v1:Vector {vector_id: change.vector1_id})-[:HAS_ANGLE_POINT]->(ap:AnglePoint)<-[:HAS_ANGLE_POINT]-(v2:Vector {vector_id: change.vector2_id})
+        MATCH (cp) WHERE elementId(cp) = $cp_id
+        WITH DISTINCT ap, cp
+        WHERE NOT EXISTS { (cp)-[:IS_CRITICAL_POINT]-(ap) }
+        CREATE (cp)-[:IS_CRITICAL_POINT]->(ap)
+    """
+    tx.run(
+        query,
+        direction_changes=_get_unique_rows(walk.direction_changes),
+        cp_id=shared_node_id("CriticalPoint", reason="Direction Change"),
+    )
+
+    # The comparison nodes are matched by their element ids, so all the labels share a statement
+    query = """
+        UNWIND $comparisons AS comparison
+        MATCH (v1:Vector {vector_id: comparison.vector1_id}),
+            (v2:Vector {vector_id: comparison.vector2_id})
+        MATCH (vect) WHERE elementId(vect) = comparison.comparison_id
+        CALL {
+            WITH v1, v2, vect
+            WITH v1, v2, vect
+            WHERE NOT EXISTS { (v1)-[:IN]->(vect)-[:OUT]->(v2) }
+            CREATE (v1)-[:IN]->(vect)-[:OUT]->(v2)
+        }
+    """
+    tx.run(
+        query,
+        comparisons=[
+            dict(comparison, comparison_id=shared_node_id(comparison["label"]))
+            for comparison in _get_unique_rows(walk.magnitude_comparisons)
+        ],
+    )
+
+
+def _get_unique_rows(rows: list[dict]) -> list[dict]:
+    """The rows without repetitions of the revisited vectors, in their order"""
+    return list({tuple(sorted(row.items())): row for row in rows}.values())
+
+
+def _get_first_vector(graph: ContourGraph, min_angle_point: AnglePoint) -> VectorDetails:
+    """The segment of the vectors of the minimum angle point with the largest sum of x, as in find_next_vector"""
+    candidates = [
+        (min_angle_point.x + segment.x1 + segment.x2, segment)
+        for vector_id in graph.angle_point_vectors.get(min_angle_point.id, [])
+        for segment in graph.vectors[vector_id].segments
+    ]
+    if not candidates:
+        raise ValueError(f"No vectors found for angle point {min_angle_point.id}")
+    return max(candidates, key=lambda candidate: candidate[0])[1]
+
+
+def _get_next_vector(
+    graph: ContourGraph,
+    last_vector_id: str,
+    angle_point: AnglePoint,
+    processed_vector_ids: list[str],
+) -> Union[tuple[VectorDetails, AnglePoint], None]:
+    """Another vector of the angle point and its other angle point, as _get_next_vector in contour_traverse"""
+    if last_vector_id not in graph.angle_point_vectors.get(angle_point.id, []):
+        return None
+
+    candidates = []
+    for vector_id in graph.angle_point_vectors[angle_point.id]:
+        vector = graph.vectors[vector_id]
+        if vector_id == last_vector_id or not vector.segments:
+            continue
+        for next_angle_point_id in vector.angle_point_ids:
+            next_angle_point = graph.angle_points.get(next_angle_point_id)
+            if next_angle_point is None or next_angle_point_id == angle_point.id:
+                continue
+            distance = math.dist((angle_point.x, angle_point.y), (next_angle_point.x, next_angle_point.y))
+            candidates.append(
+                ((vector_id in processed_vector_ids, distance == 0, distance, vector_id, next_angle_point_id),
+                 vector, next_angle_point)
+            )
+
+    if not candidates:
+        return None
+
+    _, vector, next_angle_point = min(candidates, key=lambda candidate: candidate[0])
+    return _get_segment(vector, angle_point, next_angle_point), next_angle_point
+
+
+def _get_segment(vector: ContourVector, angle_point: AnglePoint, next_angle_point: AnglePoint) -> VectorDetails:
+    """The segment between the angle points, or else the one starting at one of them"""
+
+    def touches(segment, point):
+        return (segment.x1, segment.y1) == (point.x, point.y) or (segment.x2, segment.y2) == (point.x, point.y)
+
+    return min(
+        vector.segments,
+        key=lambda segment: (not touches(segment, angle_point)) + (not touches(segment, next_angle_point)),
+    )
+
+
+def _get_vector_value(vector: VectorDetails, angle_point: AnglePoint) -> tuple:
+    """Vector from the angle point to the other end of the segment, as calculate_and_set_relative_params"""
+    if vector.x1 == angle_point.x and vector.y1 == angle_point.y:
+        return vector.x2 - angle_point.x, vector.y2 - angle_point.y
+    return vector.x1 - angle_point.x, vector.y1 - angle_point.y
+
+
+def _get_shared_angle_points(graph: ContourGraph, vector1_id: str, vector2_id: str) -> set[str]:
+    return set(graph.vectors[vector1_id].angle_point_ids) & set(graph.vectors[vector2_id].angle_point_ids)
+
+
+def _calculate_direction(value1: tuple, value2: tuple) -> str:
+    cross_product = value1[0] * value2[1] - value1[1] * value2[0]
+    return "CounterClockwise" if cross_product < 0 else "Clockwise" if cross_product > 0 else "Collinear"
+
+
+def _compare_magnitudes(vector1: ContourVector, vector2: ContourVector) -> str:
+    if vector1.magnitude > vector2.magnitude:
+        return "VectLonger"
+    if vector1.magnitude < vector2.magnitude:
+        return "VectShorter"
+    return "VectEqual"
@@ -12,6 +12,7 @@ from logic.quadrant_checker import (
 from logic.relative_params_service import (
     calculate_and_set_relative_params,
 )
+from logic.shared_nodes import shared_node_id
 from model.angle_point import AnglePoint
 from model.vector_details import VectorDetails
 
@@ -28,11 +29,18 @@ def find_starting_point(
         WITH apLoc, n
         ORDER BY apLoc.y, apLoc.x
         LIMIT 1
-        MERGE (criticalPoint: CriticalPoint {reason: "First point"})
-        MERGE (criticalPoint)<-[:IS_CRITICAL_POINT]-(n)
+        MATCH (criticalPoint) WHERE elementId(criticalPoint) = $cp_id
+        CALL {
+            WITH n, criticalPoint
+            WITH n, criticalPoint
+            WHERE NOT EXISTS { (criticalPoint)<-[:IS_CRITICAL_POINT]-(n) }
+            CREATE (criticalPoint)<-[:IS_CRITICAL_POINT]-(n)
+        }
         RETURN {x: apLoc.x, y: apLoc.y, id: n.id} AS MinAnglePoint
     """
-    result: Record | None = tx.run(query, image_id=image_id).single()
+    result: Record | None = tx.run(
+        query, image_id=image_id, cp_id=shared_node_id("CriticalPoint", reason="First point")
+    ).single()
 
     if result is None:
         return None
@@ -164,16 +172,23 @@ def _get_first_vector(tx: ManagedTransaction, min_angle_point_id: int) -> Vector
         VectorDetails: The first vector of the contour.
     """
     query = """
-        MATCH (ap:AnglePoint {id: $id})--(v:Vector)--(coords:VectorCoordinates)
-        WITH v, coords, ap, (ap.x + coords.x1 + coords.x2) AS sum_x
+        MATCH (apLoc:AnglePointCoordinates)--(ap:AnglePoint {id: $id})--(v:Vector)--(coords:VectorCoordinates)
+        WITH v, coords, ap, (apLoc.x + coords.x1 + coords.x2) AS sum_x
         ORDER BY sum_x DESC
         LIMIT 1
-        MERGE (cp:CriticalPoint {reason: "First Line"})
-        MERGE (cp)<-[:IS_CRITICAL_POINT]-(v)
+        MATCH (cp) WHERE elementId(cp) = $cp_id
+        CALL {
+            WITH v, cp
+            WITH v, cp
+            WHERE NOT EXISTS { (cp)<-[:IS_CRITICAL_POINT]-(v) }
+            CREATE (cp)<-[:IS_CRITICAL_POINT]-(v)
+        }
         RETURN v.vector_id AS uuid, coords.x1 AS x1, coords.y1 AS y1, coords.x2 AS x2, coords.y2 AS y2
     """
 
-    result: Record | None = tx.run(query, id=min_angle_point_id).single()
+    result: Record | None = tx.run(
+        query, id=min_angle_point_id, cp_id=shared_node_id("CriticalPoint", reason="First Line")
+    ).single()
 
     if result is None:
         raise ValueError(f"No vectors found for angle point {min_angle_point_id}")
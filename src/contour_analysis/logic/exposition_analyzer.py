@@ -1,10 +1,16 @@
 # TODO maybe to move to the another Nuclio function
 
 import logging
+from typing import Optional
+
 from neo4j import ManagedTransaction, Result
 
+from logic.shared_nodes import shared_node_id
+
 
-def analyze_exposition(tx: ManagedTransaction, image_id: str) -> None:
+def analyze_exposition(
+    tx: ManagedTransaction, image_id: str, vector_angle_points: Optional[list[tuple[str, str]]] = None
+) -> None:
     """
     Analyzes the contour development for a given image.
     The contour development is considered to be monotonic if all the vectors have the same direction.
@@ -13,13 +19,14 @@ def analyze_exposition(tx: ManagedTransaction, image_id: str) -> None:
     Args:
         tx (ManagedTransaction): The managed transaction object for database operations.
         image_id (int): The ID of the image to analyze.
+        vector_angle_points (list[tuple[str, str]]): (vector_id, angle_point_id) pairs of the image if already loaded.
 
     Returns:
         None
     """
     logging.info(f"Analyzing exposition for image {image_id}")
     _analyze_contour_development(tx, image_id)
-    _analyze_contour_type(tx, image_id)
+    _analyze_contour_type(tx, image_id, vector_angle_points)
 
 
 def _analyze_contour_development(tx: ManagedTransaction, image_id: str) -> None:
@@ -45,60 +52,98 @@ def _mark_monotony_development(tx: ManagedTransaction, image_id: str) -> None:
     logging.info(f"Marking monotony development for image {image_id}")
     query = """
         MATCH (vector:Vector {image_id: $image_id})
-        MERGE (mono:Monotony)
-        MERGE (vector)-[:HAS_MONOTONY]->(mono)
+        MATCH (mono) WHERE elementId(mono) = $mono_id
+        WITH vector, mono
+        WHERE NOT EXISTS { (vector)-[:HAS_MONOTONY]->(mono) }
+        CREATE (vector)-[:HAS_MONOTONY]->(mono)
     """
-    tx.run(query, image_id=image_id)
+    tx.run(query, image_id=image_id, mono_id=shared_node_id("Monotony"))
 
 
 def _mark_non_monotony_development(tx: ManagedTransaction, image_id: str) -> None:
     logging.info(f"Marking non-monotony development for image {image_id}")
     query = """
         MATCH (vector:Vector {image_id: $image_id})
-        MERGE (nonMono:NonMonotony)
-        MERGE (vector)-[:HAS_NON_MONOTONY]->(nonMono)
+        MATCH (nonMono) WHERE elementId(nonMono) = $non_mono_id
+        WITH vector, nonMono
+        WHERE NOT EXISTS { (vector)-[:HAS_NON_MONOTONY]->(nonMono) }
+        CREATE (vector)-[:HAS_NON_MONOTONY]->(nonMono)
     """
-    tx.run(query, image_id=image_id)
+    tx.run(query, image_id=image_id, non_mono_id=shared_node_id("NonMonotony"))
 
 
-def _analyze_contour_type(tx: ManagedTransaction, image_id: str) -> None:
+def _analyze_contour_type(
+    tx: ManagedTransaction, image_id: str, vector_angle_points: Optional[list[tuple[str, str]]] = None
+) -> None:
     """
-    Analyzes the contour type for a given image. If query is able to find the path from the
-    starting vector back to itself, then the contour is considered to be closed.
+    Analyzes the contour type for a given image. If the vectors and their angle points form a cycle,
+    the path from a vector leads back to itself and the contour is considered to be closed.
 
     Args:
         tx (ManagedTransaction): The managed transaction object for database operations.
         image_id (int): The ID of the image to analyze.
+        vector_angle_points (list[tuple[str, str]]): (vector_id, angle_point_id) pairs, read when None.
 
     Returns:
         None
     """
+    if vector_angle_points is None:
+        vector_angle_points = _get_vector_angle_points(tx, image_id)
+    is_closed = has_cycle(vector_angle_points)
 
+    # The 'Closed' node if a cycle is found, the 'Open' one otherwise, is linked to all Vector and AnglePoint nodes
     query = """
-        MATCH (v:Vector {image_id: $image_id})
-        CALL apoc.path.expand(v, '>', 'AnglePoint|Vector', 0, 100) YIELD path
-        WHERE last(nodes(path)) = v
-        RETURN path
+        MATCH (n)
+        WHERE (n:Vector OR n:AnglePoint) AND n.image_id = $image_id
+        MATCH (contourType) WHERE elementId(contourType) = $contour_type_id
+        WITH n, contourType
+        WHERE NOT EXISTS { (n)-[:HAS_CONTOUR_TYPE]->(contourType) }
+        CREATE (n)-[:HAS_CONTOUR_TYPE]->(contourType)
     """
-    result: Result = tx.run(query, image_id=image_id)
-    result_list = list(result)
-
-    if result_list:
-        # If a path is found, create a 'Closed' node and link it to all Vector and AnglePoint nodes
-        query = """
-            MATCH (n)
-            WHERE (n:Vector OR n:AnglePoint) AND n.image_id = $image_id
-            MERGE (closed:Closed)
-            MERGE (n)-[:HAS_CONTOUR_TYPE]->(closed)
-        """
-    else:
-        # If no path is found, create an 'Open' node and link it to all Vector and AnglePoint nodes
-        query = """
-            MATCH (n)
-            WHERE (n:Vector OR n:AnglePoint) AND n.image_id = $image_id
-            MERGE (open:Open)
-            MERGE (n)-[:HAS_CONTOUR_TYPE]->(open)
-        """
-
-    tx.run(query, image_id=image_id)
-    logging.info(f"_analyze_contour_type: {result_list}")
+    tx.run(query, image_id=image_id, contour_type_id=shared_node_id("Closed" if is_closed else "Open"))
+    logging.info(f"_analyze_contour_type: closed={is_closed}")
+
+
+def _get_vector_angle_points(tx: ManagedTransaction, image_id: str) -> list[tuple[str, str]]:
+    query = """
+        MATCH (v:Vector {image_id: $image_id})-[:HAS_ANGLE_POINT]->(ap:AnglePoint)
+        RETURN v.vector_id AS vector_id, ap.id AS angle_point_id
+    """
+    return [(record["vector_id"], record["angle_point_id"]) for record in tx.run(query, image_id=image_id)]
+
+
+def has_cycle(vector_angle_points: list[tuple[str, str]]) -> bool:
+    """
+    Checks whether the undirected graph of vectors and angle points has a cycle.
+    Union-find over the edges: an edge between two nodes which are already connected closes a cycle.
+
+    Args:
+        vector_angle_points (list[tuple[str, str]]): (vector_id, angle_point_id) edges.
+
+    Returns:
+        bool: True if there is a cycle.
+    """
+    parents: dict[tuple[str, str], tuple[str, str]] = {}
+    sizes: dict[tuple[str, str], int] = {}
+
+    def find(node):
+        root = node
+        while parents.setdefault(root, root) != root:
+            root = parents[root]
+        # Path compression
+        while node != root:
+            parents[node], node = root, parents[node]
+        return root
+
+    for vector_id, angle_point_id in set(vector_angle_points):
+        # Vectors and angle points are kept apart even if their ids are equal
+        vector_root = find(("Vector", vector_id))
+        angle_point_root = find(("AnglePoint", angle_point_id))
+        if vector_root == angle_point_root:
+            return True
+        # The smaller tree is attached to the larger one to keep the trees shallow
+        if sizes.get(vector_root, 1) > sizes.get(angle_point_root, 1):
+            vector_root, angle_point_root = angle_point_root, vector_root
+        parents[vector_root] = angle_point_root
+        sizes[angle_point_root] = sizes.get(angle_point_root, 1) + sizes.get(vector_root, 1)
+    return False
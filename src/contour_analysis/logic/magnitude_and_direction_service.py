@@ -6,6 +6,7 @@ import numpy as np
 from logic.magnitude_comparator import (
     compare_vector_magnitude_and_create_nodes,
 )
+from logic.shared_nodes import shared_node_id
 from neo4j import ManagedTransaction, Record
 
 
@@ -84,20 +85,37 @@ def calculate_direction(
 
 def add_direction(tx, vector1_id: str, vector2_id: str, direction: str):
     logging.debug(f"Adding direction: {direction} to the vectors")
+    if direction is None:
+        # The vectors share no angle point or have no values, there is nothing to link
+        return
     query = """
-        MATCH (v1:Vector {vector_id: $vector1_id})-[:HAS_ANGLE_POINT]->(ap:AnglePoint)<-[:HAS_ANGLE_POINT]-(v2:Vector {vector_id: $vector2_id})--(v2:Vector)
-        MERGE (vd:VectDirection {direction: $direction})
-        MERGE (v1)-[:HAS_DIRECTION]->(vd)-[:HAS_DIRECTION]->(v2)
+        MATCH (v1:Vector {vector_id: $vector1_id})-[:HAS_ANGLE_POINT]->(ap:AnglePoint)<-[:HAS_ANGLE_POINT]-(v2:Vector {vector_id: $vector2_id})
+        WITH DISTINCT v1, v2
+        MATCH (vd) WHERE elementId(vd) = $direction_id
+        WITH v1, v2, vd
+        WHERE NOT EXISTS { (v1)-[:HAS_DIRECTION]->(vd)-[:HAS_DIRECTION]->(v2) }
+        CREATE (v1)-[:HAS_DIRECTION]->(vd)-[:HAS_DIRECTION]->(v2)
     """
-    tx.run(query, vector1_id=vector1_id, vector2_id=vector2_id, direction=direction)
+    tx.run(
+        query,
+        vector1_id=vector1_id,
+        vector2_id=vector2_id,
+        direction_id=shared_node_id("VectDirection", direction=direction),
+    )
 
 
 def create_critical_point(tx, vector1_id: str, vector2_id: str):
     logging.info("Finding angle point between two vectors")
     query = """
         MATCH (v1:Vector {vector_id: $vector1_id})-[:HAS_ANGLE_POINT]->(ap:AnglePoint)<-[:HAS_ANGLE_POINT]-(v2:Vector {vector_id: $vector2_id})
-        MERGE (cp:CriticalPoint {reason: "Direction Change"})
-        MERGE (cp)-[:IS_CRITICAL_POINT]-(ap)
-        RETURN cp
+        MATCH (cp) WHERE elementId(cp) = $cp_id
+        WITH DISTINCT ap, cp
+        WHERE NOT EXISTS { (cp)-[:IS_CRITICAL_POINT]-(ap) }
+        CREATE (cp)-[:IS_CRITICAL_POINT]->(ap)
     """
-    tx.run(query, vector1_id=vector1_id, vector2_id=vector2_id).single()
+    tx.run(
+        query,
+        vector1_id=vector1_id,
+        vector2_id=vector2_id,
+        cp_id=shared_node_id("CriticalPoint", reason="Direction Change"),
+    )
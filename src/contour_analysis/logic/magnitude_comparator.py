@@ -1,5 +1,7 @@
 import logging
 
+from logic.shared_nodes import shared_node_id
+
 
 def compare_vector_magnitude_and_create_nodes(tx, vector1_id: str, vector2_id: str):
     logging.info("Comparing vector magnitudes and creating respective nodes")
@@ -14,10 +16,12 @@ def compare_vector_magnitude_and_create_nodes(tx, vector1_id: str, vector2_id: s
     result = tx.run(compare_query, vector1_id=vector1_id, vector2_id=vector2_id)
     label = result.single()[0]
 
-    create_node_query = f"""
-      MATCH (v1:Vector {{vector_id: $vector1_id}}),
-                  (v2:Vector {{vector_id: $vector2_id}})
-      MERGE (vect:{label})
-      MERGE (v1)-[:IN]->(vect)-[:OUT]->(v2)
+    create_node_query = """
+      MATCH (v1:Vector {vector_id: $vector1_id}),
+                  (v2:Vector {vector_id: $vector2_id})
+      MATCH (vect) WHERE elementId(vect) = $vect_id
+      WITH v1, v2, vect
+      WHERE NOT EXISTS { (v1)-[:IN]->(vect)-[:OUT]->(v2) }
+      CREATE (v1)-[:IN]->(vect)-[:OUT]->(v2)
     """
-    tx.run(create_node_query, vector1_id=vector1_id, vector2_id=vector2_id)
+    tx.run(create_node_query, vector1_id=vector1_id, vector2_id=vector2_id, vect_id=shared_node_id(label))
@@ -1,5 +1,7 @@
 from neo4j import ManagedTransaction
 
+from logic.shared_nodes import shared_node_id
+
 
 def check_quadrant_change(
     tx: ManagedTransaction, vector1_id: str, vector2_id: str
@@ -35,14 +37,27 @@ def mark_quadrant_change(
     query = """
         MATCH (v1:Vector {vector_id: $vector1_id})
         MATCH (v2:Vector {vector_id: $vector2_id})
-        MERGE (quad_change:QuadrantChange)
-        MERGE (v1)-[:HAS_QUADRANT_CHANGE]->(quad_change)-[:HAS_QUADRANT_CHANGE]->(v2)
-        MERGE (cp:CriticalPoint {reason: 'Quadrant Change'})
+        MATCH (quad_change) WHERE elementId(quad_change) = $quad_change_id
+        MATCH (cp) WHERE elementId(cp) = $cp_id
+        CALL {
+            WITH v1, v2, quad_change
+            WITH v1, v2, quad_change
+            WHERE NOT EXISTS { (v1)-[:HAS_QUADRANT_CHANGE]->(quad_change)-[:HAS_QUADRANT_CHANGE]->(v2) }
+            CREATE (v1)-[:HAS_QUADRANT_CHANGE]->(quad_change)-[:HAS_QUADRANT_CHANGE]->(v2)
+        }
         WITH v1, v2, cp
         MATCH (v1)--(ap:AnglePoint)--(v2)
-        MERGE (ap)-[:IS_CRITICAL_POINT]->(cp)
+        WITH DISTINCT ap, cp
+        WHERE NOT EXISTS { (ap)-[:IS_CRITICAL_POINT]->(cp) }
+        CREATE (ap)-[:IS_CRITICAL_POINT]->(cp)
     """
-    tx.run(query, vector1_id=vector1_id, vector2_id=vector2_id)
+    tx.run(
+        query,
+        vector1_id=vector1_id,
+        vector2_id=vector2_id,
+        quad_change_id=shared_node_id("QuadrantChange"),
+        cp_id=shared_node_id("CriticalPoint", reason="Quadrant Change"),
+    )
 
 
 def _get_vector_quadrant(tx: ManagedTransaction, vector_id: str) -> int:
@@ -5,6 +5,7 @@ from neo4j import ManagedTransaction
 import numpy as np
 
 from logic.helpers import calculate_half_plane_and_quadrant
+from logic.shared_nodes import shared_node_id
 from model.angle_point import AnglePoint
 from model.vector_details import VectorDetails
 
@@ -63,26 +64,36 @@ def calculate_and_set_relative_params(
     query = """
         MATCH (vector:Vector)
         WHERE vector.vector_id = $vector_id
-        WITH vector
-        MERGE (vertical:VerticalVectorHalfPlane {vertical_plane: $vertical_plane})
-        MERGE (horizontal:HorizontalVectorHalfPlane {horizontal_plane: $horizontal_plane})
-        MERGE (vector)-[:HAS_VERTICAL_VECTOR_HALF_PLANE]->(vertical)
-        MERGE (vector)-[:HAS_HORIZONTAL_VECTOR_HALF_PLANE]->(horizontal)
+        MATCH (vertical) WHERE elementId(vertical) = $vertical_id
+        MATCH (horizontal) WHERE elementId(horizontal) = $horizontal_id
+        CALL {
+            WITH vector, vertical
+            WITH vector, vertical
+            WHERE NOT EXISTS { (vector)-[:HAS_VERTICAL_VECTOR_HALF_PLANE]->(vertical) }
+            CREATE (vector)-[:HAS_VERTICAL_VECTOR_HALF_PLANE]->(vertical)
+        }
+        CALL {
+            WITH vector, horizontal
+            WITH vector, horizontal
+            WHERE NOT EXISTS { (vector)-[:HAS_HORIZONTAL_VECTOR_HALF_PLANE]->(horizontal) }
+            CREATE (vector)-[:HAS_HORIZONTAL_VECTOR_HALF_PLANE]->(horizontal)
+        }
     """
     result = tx.run(
         query,
         vector_id=vector.uuid,
-        horizontal_plane=horizontal_plane,
-        vertical_plane=vertical_plane,
+        horizontal_id=shared_node_id("HorizontalVectorHalfPlane", horizontal_plane=horizontal_plane),
+        vertical_id=shared_node_id("VerticalVectorHalfPlane", vertical_plane=vertical_plane),
     )
 
     query = """
         MATCH (vector:Vector)
         WHERE vector.vector_id = $vector_id
-        WITH vector
-        MERGE (quadrant:Quadrant {quadrant: $quadrant})
-        MERGE (vector)-[:HAS_QUADRANT]->(quadrant)
+        MATCH (quadrant) WHERE elementId(quadrant) = $quadrant_id
+        WITH vector, quadrant
+        WHERE NOT EXISTS { (vector)-[:HAS_QUADRANT]->(quadrant) }
+        CREATE (vector)-[:HAS_QUADRANT]->(quadrant)
     """
-    result = tx.run(query, vector_id=vector.uuid, quadrant=quadrant)
+    result = tx.run(query, vector_id=vector.uuid, quadrant_id=shared_node_id("Quadrant", quadrant=quadrant))
     logging.debug("Half planes and quadrants are created for the line ")
     return result
@@ -0,0 +1,99 @@
+import logging
+
+from neo4j import Driver, ManagedTransaction
+
+logging.basicConfig(level=logging.INFO)
+
+# Nodes shared by all images as (label, properties). They are created once and matched by their
+# element ids afterwards, so parallel workers don't lock them with MERGE on every write.
+SHARED_NODES: list[tuple[str, dict]] = (
+    [("CriticalPoint", {"reason": reason})
+     for reason in ["First point", "First Line", "Quadrant Change", "Direction Change"]]
+    + [("Quadrant", {"quadrant": quadrant}) for quadrant in [1, 2, 3, 4, -1]]
+    + [("VerticalVectorHalfPlane", {"vertical_plane": plane}) for plane in ["Right", "Left"]]
+    + [("HorizontalVectorHalfPlane", {"horizontal_plane": plane}) for plane in ["Upper", "Lower"]]
+    + [("VectDirection", {"direction": direction}) for direction in ["Clockwise", "CounterClockwise", "Collinear"]]
+    + [(label, {}) for label in ["QuadrantChange", "VectLonger", "VectShorter", "VectEqual",
+                                 "Monotony", "NonMonotony", "Closed", "Open"]]
+)
+
+# Element ids of the shared nodes cached in the process
+_element_ids: dict[tuple, str] = {}
+
+
+def load_shared_nodes(driver: Driver) -> None:
+    """
+    Creates the missing shared nodes and caches their element ids. The cached ids are checked first,
+    since the statistical reduction may delete nodes and Neo4j reuses the ids of deleted nodes.
+
+    Args:
+        driver (Driver): The Neo4j driver.
+    Returns:
+        None
+    """
+    with driver.session() as session:
+        if _element_ids and session.execute_read(_are_element_ids_valid, dict(_element_ids)):
+            return
+
+        element_ids = session.execute_write(_merge_shared_nodes)
+
+    _element_ids.clear()
+    _element_ids.update(element_ids)
+    logging.info(f"Cached {len(element_ids)} shared nodes")
+
+
+def shared_node_id(label: str, **properties) -> str:
+    """
+    Returns the element id of a shared node, load_shared_nodes has to be called before.
+
+    Args:
+        label (str): The label of the node.
+        properties: The properties of the node.
+    Returns:
+        str: The element id.
+    """
+    return _element_ids[_get_key(label, properties)]
+
+
+def _get_key(label: str, properties: dict) -> tuple:
+    return label, tuple(sorted(properties.items()))
+
+
+def _merge_shared_nodes(tx: ManagedTransaction) -> dict[tuple, str]:
+    # Nodes without properties can't have a uniqueness constraint, so parallel workers take the write lock
+    # of the first shared node and merge the others one after another, each seeing the nodes of the previous
+    lock_label, lock_properties = SHARED_NODES[0]
+    lock_pattern = ", ".join(f"{key}: ${key}" for key in lock_properties)
+    tx.run(f"""
+        MERGE (lock:{lock_label} {{{lock_pattern}}})
+        SET lock._LOCK_ = true
+        REMOVE lock._LOCK_
+    """, **lock_properties).consume()
+
+    element_ids = {}
+    for label, properties in SHARED_NODES:
+        # Labels and property keys can't be parameters
+        properties_pattern = ", ".join(f"{key}: ${key}" for key in properties)
+        query = f"""
+            MERGE (n:{label} {{{properties_pattern}}})
+            RETURN elementId(n) AS id
+        """
+        element_ids[_get_key(label, properties)] = tx.run(query, **properties).single()["id"]
+    return element_ids
+
+
+def _are_element_ids_valid(tx: ManagedTransaction, element_ids: dict[tuple, str]) -> bool:
+    query = """
+        MATCH (n)
+        WHERE elementId(n) IN $ids
+        RETURN elementId(n) AS id, labels(n) AS labels, properties(n) AS properties
+    """
+    nodes = {record["id"]: record for record in tx.run(query, ids=list(element_ids.values()))}
+
+    for (label, properties), element_id in element_ids.items():
+        node = nodes.get(element_id)
+        if node is None or label not in node["labels"]:
+            return False
+        if any(node["properties"].get(key) != value for key, value in properties):
+            return False
+    return True
@@ -0,0 +1,73 @@
+import logging
+
+from neo4j import ManagedTransaction
+
+from count_sketch import CountSketch
+from logic.shared_nodes import shared_node_id
+
+logging.basicConfig(level=logging.INFO)
+
+
+def record_structural_elements(tx: ManagedTransaction, image_id: str, sketch_id: str) -> None:
+    """
+    Counts the vectors and the quadrant change angle points of the image and adds the counts
+    to the sketch of the process, concept_creator reads the percentiles of the merged sketches.
+    Every process writes its own sketch node, so parallel workers don't update the same node.
+    The vectors of the image are marked as recorded, so a repeated call doesn't add the image again.
+
+    Args:
+        tx (ManagedTransaction): The managed transaction object.
+        image_id (str): The ID of the image.
+        sketch_id (str): The ID of the sketch of the process.
+    Returns:
+        None
+    """
+    # As in the percentile query of concept_creator, images without vectors aren't counted
+    query = """
+        MATCH (vector:Vector {image_id: $image_id})
+        WITH collect(vector) AS vectors
+        WHERE size(vectors) > 0 AND none(vector IN vectors WHERE vector.structuralElementsRecorded)
+        FOREACH (vector IN vectors | SET vector.structuralElementsRecorded = true)
+        WITH size(vectors) AS vectorsCount
+        OPTIONAL MATCH (anglePoint:AnglePoint {image_id: $image_id})
+        WHERE $cp_id IN [(anglePoint)-[:IS_CRITICAL_POINT]->(cp) | elementId(cp)]
+        RETURN vectorsCount, count(anglePoint) AS anglePointsCount
+    """
+    counts = tx.run(
+        query, image_id=image_id, cp_id=shared_node_id("CriticalPoint", reason="Quadrant Change")
+    ).single()
+    if counts is None:
+        logging.info(f"Structural elements of image {image_id} are recorded or missing, skipping")
+        return
+
+    query = """
+        MERGE (sketch:StructuralElementsSketch {sketch_id: $sketch_id})
+        RETURN sketch.vectorsCounts AS vectorsCounts, sketch.vectorsFrequencies AS vectorsFrequencies,
+            sketch.anglePointsCounts AS anglePointsCounts, sketch.anglePointsFrequencies AS anglePointsFrequencies
+    """
+    sketch = tx.run(query, sketch_id=sketch_id).single()
+    vectors_sketch = CountSketch(sketch["vectorsCounts"], sketch["vectorsFrequencies"])
+    angle_points_sketch = CountSketch(sketch["anglePointsCounts"], sketch["anglePointsFrequencies"])
+
+    vectors_sketch.add(counts["vectorsCount"])
+    if counts["anglePointsCount"] > 0:
+        angle_points_sketch.add(counts["anglePointsCount"])
+
+    vectors_counts, vectors_frequencies = vectors_sketch.to_lists()
+    angle_points_counts, angle_points_frequencies = angle_points_sketch.to_lists()
+    query = """
+        MATCH (sketch:StructuralElementsSketch {sketch_id: $sketch_id})
+        SET sketch.vectorsCounts = $vectors_counts, sketch.vectorsFrequencies = $vectors_frequencies,
+            sketch.anglePointsCounts = $angle_points_counts, sketch.anglePointsFrequencies = $angle_points_frequencies
+    """
+    tx.run(
+        query,
+        sketch_id=sketch_id,
+        vectors_counts=vectors_counts,
+        vectors_frequencies=vectors_frequencies,
+        angle_points_counts=angle_points_counts,
+        angle_points_frequencies=angle_points_frequencies,
+    )
+    logging.info(
+        f"Recorded {counts['vectorsCount']} vectors and {counts['anglePointsCount']} critical angle points for image {image_id}"
+    )
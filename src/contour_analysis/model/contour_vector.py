@@ -0,0 +1,12 @@
+from model.vector_details import VectorDetails
+
+
+class ContourVector:
+    def __init__(self, uuid: str, angle_point_ids: list[str], segments: list[VectorDetails], magnitude: float):
+        self.uuid: str = uuid
+        self.angle_point_ids: list[str] = angle_point_ids
+        self.segments: list[VectorDetails] = segments
+        self.magnitude: float = magnitude
+
+    def __str__(self):
+        return f"ContourVector(uuid={self.uuid}, angle_point_ids={self.angle_point_ids}, magnitude={self.magnitude})"
@@ -0,0 +1,19 @@
+class ContourWalk:
+    """Results of the contour traversal which are written to the graph"""
+
+    def __init__(self, first_point_id: str, first_vector_id: str):
+        self.first_point_id: str = first_point_id
+        self.first_vector_id: str = first_vector_id
+        # {vector_id, x, y, horizontal_plane, vertical_plane, quadrant} of every visited vector
+        self.vector_values: list[dict] = []
+        # {vector1_id, vector2_id} of the consecutive vectors in different quadrants
+        self.quadrant_changes: list[dict] = []
+        # {vector1_id, vector2_id, direction} of the consecutive vectors sharing an angle point
+        self.directions: list[dict] = []
+        # {vector1_id, vector2_id} of the consecutive vectors where the direction changes
+        self.direction_changes: list[dict] = []
+        # {vector1_id, vector2_id, label} with VectLonger, VectShorter or VectEqual label
+        self.magnitude_comparisons: list[dict] = []
+
+    def __str__(self):
+        return f"ContourWalk(first_point_id={self.first_point_id}, vectors={len(self.vector_values)})"
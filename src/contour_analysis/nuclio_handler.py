@@ -5,6 +5,9 @@ from contour_analysis_repository import ContourAnalysisRepository
 
 from pydantic_settings import BaseSettings
 
+from downstream_dispatcher import DownstreamDispatcher
+from schema_bootstrap import bootstrap_schema
+
 
 HANDLER_NAME = "Contour analysis"
 
@@ -16,6 +19,15 @@ class Settings(BaseSettings):
     neo4j_user: str
     neo4j_pass: str
     next_nuclio: str = ""
+    # Timeout of the next function calls in seconds
+    next_nuclio_timeout: float = 600
+    # Don't wait for the responses of the next functions
+    next_nuclio_fire_and_forget: bool = False
+    next_nuclio_max_in_flight: int = 16
+    # Create the missing indexes and constraints of the graph database on start
+    schema_bootstrap: bool = True
+    # "cypher" traverses the contour step by step in the database, "memory" reads the image once and writes the results at once
+    contour_engine: str = "cypher"
 
 
 def init_context(context):
@@ -29,12 +41,28 @@ def init_context(context):
     )
 
     contour_analysis_repository = ContourAnalysisRepository(
-        Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass
+        Settings().neo4j_dsn,
+        Settings().neo4j_user,
+        Settings().neo4j_pass,
+        contour_engine=Settings().contour_engine,
     )
     setattr(
         context.user_data, "contour_analysis_repository", contour_analysis_repository
     )
+    if Settings().schema_bootstrap:
+        bootstrap_schema(Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass)
+
     setattr(context.user_data, "next_nuclio", Settings().next_nuclio)
+    setattr(
+        context.user_data,
+        "downstream_dispatcher",
+        DownstreamDispatcher(
+            Settings().next_nuclio,
+            timeout=Settings().next_nuclio_timeout,
+            fire_and_forget=Settings().next_nuclio_fire_and_forget,
+            max_in_flight=Settings().next_nuclio_max_in_flight,
+        ),
+    )
 
 
 def http_handler(context, event):
@@ -43,32 +71,23 @@ def http_handler(context, event):
 
         image_id = event.body
         image_id = image_id.decode("utf-8") if isinstance(image_id, bytes) else image_id
+        # A batch of images arrives as a list of image ids and is forwarded as is
+        image_ids = image_id if isinstance(image_id, list) else [image_id]
 
-        context.logger.debug_with(
-            f"Received image_id: {image_id}", handler=HANDLER_NAME
-        )
-
-        try:
-            context.user_data.contour_analysis_repository.analyze_contour(image_id)
-        except Exception as e:
-            context.logger.error_with(f"Error analyzing contour:\n {e}", handler=HANDLER_NAME)
-            traceback.print_exc()
-
-        next_functions_str = context.user_data.next_nuclio
-
-        if next_functions_str:
-            next_nuclio = next_functions_str.split(";")
+        for image_id_item in image_ids:
             context.logger.debug_with(
-                f"Next functions: {next_nuclio}", handler=HANDLER_NAME
+                f"Received image_id: {image_id_item}", handler=HANDLER_NAME
             )
 
-            if len(next_nuclio) > 0:
-                for func in next_nuclio:
-                    context.logger.info_with(f"Calling {func}", handler=HANDLER_NAME)
-                    response = requests.post(func, json=str(image_id))
-                    context.logger.info_with(
-                        f"Response: {response.status_code}", handler=HANDLER_NAME
-                    )
+            try:
+                context.user_data.contour_analysis_repository.analyze_contour(image_id_item)
+            except Exception as e:
+                context.logger.error_with(f"Error analyzing contour:\n {e}", handler=HANDLER_NAME)
+                traceback.print_exc()
+
+        next_payload = image_id if isinstance(image_id, list) else str(image_id)
+        for func, status_code in context.user_data.downstream_dispatcher.dispatch(next_payload):
+            context.logger.info_with(f"Response from {func}: {status_code}", handler=HANDLER_NAME)
 
         context.Response(
             body=f"Points detected for image: {image_id}",
@@ -1,6 +1,4 @@
 """Image Exporter Nuclio Handler"""
-import json
-import os
 import base64
 import io
 import traceback
@@ -12,7 +10,11 @@ import numpy as np
 
 from pydantic_settings import BaseSettings
 
+from downstream_dispatcher import DownstreamDispatcher
+from schema_bootstrap import bootstrap_schema
+
 from image_to_neo_exporter import ImageNeoExporter
+from image_transport import decode_request_images
 from nuclio_sdk import Event
 
 HANDLER_NAME = "Image Exporter"
@@ -25,6 +27,13 @@ class Settings(BaseSettings):
     neo4j_user: str
     neo4j_pass: str
     next_nuclio: str = ""
+    # Timeout of the next function calls in seconds
+    next_nuclio_timeout: float = 600
+    # Don't wait for the responses of the next functions
+    next_nuclio_fire_and_forget: bool = False
+    next_nuclio_max_in_flight: int = 16
+    # Create the missing indexes and constraints of the graph database on start
+    schema_bootstrap: bool = True
 
 
 def init_context(context):
@@ -41,7 +50,20 @@ def init_context(context):
     exporter = ImageNeoExporter(Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass)
     setattr(context.user_data, "exporter", exporter)
 
+    if Settings().schema_bootstrap:
+        bootstrap_schema(Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass)
+
     setattr(context.user_data, "next_nuclio", Settings().next_nuclio)
+    setattr(
+        context.user_data,
+        "downstream_dispatcher",
+        DownstreamDispatcher(
+            Settings().next_nuclio,
+            timeout=Settings().next_nuclio_timeout,
+            fire_and_forget=Settings().next_nuclio_fire_and_forget,
+            max_in_flight=Settings().next_nuclio_max_in_flight,
+        ),
+    )
 
 
 def http_handler(context, event):
@@ -49,31 +71,34 @@ def http_handler(context, event):
     try:
         data = event.body
 
-        decoded_data = base64.b64decode(data['image'])
-        np_data = np.fromstring(decoded_data, np.uint8)
-        img = cv2.imdecode(np_data, cv2.IMREAD_UNCHANGED)
+        # Images sent as binary bodies are decoded without the base64 step
+        images_data = decode_request_images(data, event.content_type, event.headers)
+        if images_data is None:
+            images_data = [base64.b64decode(data['image'])]
 
-        context.logger.debug_with(
-            f"Received image: {img.shape}", handler=HANDLER_NAME
-        )
-
-        image_id = context.user_data.exporter.export_image(img)
+        image_ids = []
+        for image_data in images_data:
+            # frombuffer wraps the received bytes without copying them
+            np_data = np.frombuffer(image_data, np.uint8)
+            img = cv2.imdecode(np_data, cv2.IMREAD_UNCHANGED)
 
-        context.logger.info_with(f"Exported image: {image_id}", handler=HANDLER_NAME)
+            context.logger.debug_with(
+                f"Received image: {img.shape}", handler=HANDLER_NAME
+            )
 
-        next_functions_str = context.user_data.next_nuclio
+            image_id = context.user_data.exporter.export_image(img)
+            image_ids.append(image_id)
 
-        if next_functions_str:
-            next_nuclio = next_functions_str.split(";")
-            context.logger.debug_with(f"Next functions: {next_nuclio}", handler=HANDLER_NAME)
+            context.logger.info_with(f"Exported image: {image_id}", handler=HANDLER_NAME)
 
-            if len(next_nuclio) > 0:
-                for func in next_nuclio:
-                    context.logger.info_with(f"Calling {func}", handler=HANDLER_NAME)
-                    requests.post(func, json=str(image_id))
+        responses = context.user_data.downstream_dispatcher.dispatch_many(
+            [str(image_id) for image_id in image_ids]
+        )
+        for func, status_code in responses:
+            context.logger.info_with(f"Response from {func}: {status_code}", handler=HANDLER_NAME)
 
         context.Response(
-            body=f"Image exported {image_id}",
+            body=f"Image exported {', '.join(str(image_id) for image_id in image_ids)}",
             headers={},
             content_type="text/plain",
             status_code=requests.codes.ok,  # pylint: disable=no-member
@@ -0,0 +1,61 @@
+import argparse
+import time
+
+import numpy as np
+
+from hough_builder import HoughBundler
+
+
+def generate_raw_lines(num_lines, img_size, seed):
+    """Generates HoughLinesP-like output: bundles of jittered segments around a few strokes"""
+    rng = np.random.default_rng(seed)
+    num_strokes = max(1, num_lines // 20)
+
+    strokes = rng.integers(0, img_size, size=(num_strokes, 4))
+    jitter = rng.integers(-3, 4, size=(num_lines, 4))
+    lines = strokes[rng.integers(0, num_strokes, size=num_lines)] + jitter
+
+    return np.clip(lines, 0, img_size - 1).astype(np.int32).reshape(-1, 1, 4)
+
+
+def time_process_lines(bundler, lines, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        processed_lines = bundler.process_lines(lines)
+        timings.append(time.perf_counter() - start)
+    return processed_lines, min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare HoughBundler implementations")
+    parser.add_argument('--num_lines', type=int, nargs='+', default=[50, 200, 500, 1000], help="Numbers of raw segments to bundle")
+    parser.add_argument('--img_size', type=int, default=512, help="Size of the simulated image in pixels")
+    parser.add_argument('--repeats', type=int, default=3, help="Number of runs per configuration, the best one is reported")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for generated segments")
+
+    args = parser.parse_args()
+
+    scalar_bundler = HoughBundler(min_distance=10, min_angle=10, vectorized=False)
+    vectorized_bundler = HoughBundler(min_distance=10, min_angle=10, vectorized=True)
+    grid_bundler = HoughBundler(min_distance=10, min_angle=10, clustering=HoughBundler.CLUSTERING_GRID)
+
+    print(
+        f"{'raw lines':>10} {'merged':>8} {'scalar, ms':>12} {'vectorized, ms':>16} {'speedup':>8}"
+        f" {'grid merged':>12} {'grid, ms':>10}"
+    )
+    for num_lines in args.num_lines:
+        lines = generate_raw_lines(num_lines, args.img_size, args.seed)
+
+        scalar_lines, scalar_time = time_process_lines(scalar_bundler, lines, args.repeats)
+        vectorized_lines, vectorized_time = time_process_lines(vectorized_bundler, lines, args.repeats)
+        grid_lines, grid_time = time_process_lines(grid_bundler, lines, args.repeats)
+
+        if not np.array_equal(scalar_lines, vectorized_lines):
+            raise AssertionError(f"Scalar and vectorized outputs differ for {num_lines} lines")
+
+        print(
+            f"{num_lines:>10} {len(vectorized_lines):>8} {scalar_time * 1000:>12.2f} "
+            f"{vectorized_time * 1000:>16.2f} {scalar_time / vectorized_time:>7.1f}x"
+            f" {len(grid_lines):>12} {grid_time * 1000:>10.2f}"
+        )
@@ -0,0 +1,89 @@
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+
+
+class DetectionCache:
+    """On-disk cache of detected lines. Every entry is a .npy file keyed by the image content hash
+    and the digest of the detector parameters. The least recently used entries are evicted
+    when the cache grows over max_size_bytes."""
+
+    def __init__(self, path, max_size_bytes):
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self._written_bytes = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def get(self, content_hash, parameters_digest):
+        entry_file = self._get_entry_file(content_hash, parameters_digest)
+        try:
+            lines = np.load(entry_file, allow_pickle=False)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        try:
+            # Modification time is used as the last access time for eviction
+            os.utime(entry_file)
+        except FileNotFoundError:
+            # Evicted by another process after it was read, the lines are still valid
+            pass
+        return lines
+
+    def put(self, content_hash, parameters_digest, lines):
+        entry_file = self._get_entry_file(content_hash, parameters_digest)
+        os.makedirs(os.path.dirname(entry_file), exist_ok=True)
+
+        lines = np.asarray(lines, dtype=np.int32).reshape(-1, 1, 4)
+        # Written under a temporary name, so concurrent readers never see a partial entry
+        fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(entry_file), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, lines, allow_pickle=False)
+            # Taken before the entry is visible, another process may evict it right away
+            entry_size = f.tell()
+        os.replace(temp_file, entry_file)
+
+        self._written_bytes += entry_size
+        # Scanning the cache is expensive, so it happens after every tenth of the size limit is written
+        if self._written_bytes * 10 >= self.max_size_bytes:
+            self.evict()
+
+    def evict(self):
+        self._written_bytes = 0
+
+        entries = []
+        for root, _, files in os.walk(self.path):
+            for file in files:
+                if not file.endswith(".npy"):
+                    continue
+                entry_file = os.path.join(root, file)
+                try:
+                    stat = os.stat(entry_file)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry_file))
+
+        total_size = sum(size for _, size, _ in entries)
+        if total_size <= self.max_size_bytes:
+            return
+
+        # Leaves some room, so the next eviction doesn't follow right away
+        target_size = self.max_size_bytes * 0.9
+        evicted_count = 0
+        for _, size, entry_file in sorted(entries):
+            if total_size <= target_size:
+                break
+            try:
+                os.remove(entry_file)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+            evicted_count += 1
+
+        logging.info(f"Evicted {evicted_count} entries from the detection cache {self.path}")
+
+    def _get_entry_file(self, content_hash, parameters_digest):
+        return os.path.join(self.path, parameters_digest, content_hash[:2], f"{content_hash}.npy")
@@ -0,0 +1,203 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from hough_builder import HoughBundler
+from line_detector import LineDetector
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "samples_generator"))
+
+from samples_generator import generate_triangle_images  # noqa: E402
+from square_generator import generate_square_samples  # noqa: E402
+
+MODE_STRAIGHT = "straight"
+MODE_NOISED = "noised"
+MODE_ZIGZAG = "zigzag"
+MODE_CURVED = "curved"
+MODE_SQUARE = "square"
+MODES = [MODE_STRAIGHT, MODE_NOISED, MODE_ZIGZAG, MODE_CURVED, MODE_SQUARE]
+
+
+def generate_corpus(output_dir, mode, num_images, img_size, line_width, seed):
+    """Generates the images of one configuration and returns them decoded.
+    The corpus depends only on the seed and the configuration."""
+    random.seed(f"{seed}-{mode}-{img_size}-{line_width}")
+
+    # The generators report every saved folder
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == MODE_SQUARE:
+            generate_square_samples(output_dir, num_images, img_size, line_width)
+        else:
+            generate_triangle_images(
+                output_dir,
+                num_images,
+                img_size,
+                is_noised=mode == MODE_NOISED,
+                curved_sides=mode == MODE_CURVED,
+                zigzag_sides=mode == MODE_ZIGZAG,
+                broken_sides=False,
+                line_width=line_width,
+            )
+
+    image_files = sorted(os.listdir(output_dir))
+    return [cv2.imread(os.path.join(output_dir, image_file), cv2.IMREAD_UNCHANGED) for image_file in image_files]
+
+
+def run_configuration(detector, images, repeats):
+    detect_timings = []
+    bundle_timings = []
+    raw_counts = []
+    merged_counts = []
+
+    # detect_lines reports the counts of every image
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            for image in images:
+                start = time.perf_counter()
+                detector.detect_lines(image)
+                detect_timings.append(time.perf_counter() - start)
+
+        # Segment counts and bundling time are measured separately from the end-to-end latency
+        for image in images:
+            raw_lines = detector.detect_raw_lines(image)
+            if raw_lines is None:
+                raw_counts.append(0)
+                merged_counts.append(0)
+                continue
+
+            start = time.perf_counter()
+            merged_lines = detector.bundle_lines(raw_lines)
+            bundle_timings.append(time.perf_counter() - start)
+
+            raw_counts.append(len(raw_lines))
+            merged_counts.append(len(merged_lines))
+
+        # Tracing slows down the allocations, so peak memory has its own pass.
+        # Only the allocations of Python and NumPy are traced, OpenCV buffers are not included.
+        tracemalloc.start()
+        for image in images:
+            detector.detect_lines(image)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    detect_timings = np.array(detect_timings)
+    return {
+        "images": len(images),
+        "throughput": len(detect_timings) / detect_timings.sum(),
+        "p50_ms": float(np.percentile(detect_timings, 50) * 1000),
+        "p99_ms": float(np.percentile(detect_timings, 99) * 1000),
+        "bundle_p50_ms": float(np.percentile(bundle_timings, 50) * 1000) if bundle_timings else 0.0,
+        "raw_segments": int(sum(raw_counts)),
+        "merged_lines": int(sum(merged_counts)),
+        "peak_memory_kb": peak_memory / 1024,
+    }
+
+
+def compare_with_baseline(baseline, results, tolerance, min_delta_ms):
+    """Returns the list of regressions of results against the baseline.
+    Latencies of small images are noisy, so slowdowns under min_delta_ms are ignored."""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline["results"]:
+            continue
+        expected = baseline["results"][key]
+
+        for metric in ["p50_ms", "p99_ms"]:
+            if result[metric] > max(expected[metric] * (1 + tolerance), expected[metric] + min_delta_ms):
+                regressions.append(f"{key}: {metric} {result[metric]:.2f} > {expected[metric]:.2f}")
+        if result["peak_memory_kb"] > expected["peak_memory_kb"] * (1 + tolerance):
+            regressions.append(
+                f"{key}: peak_memory_kb {result['peak_memory_kb']:.0f} > {expected['peak_memory_kb']:.0f}"
+            )
+        # The corpus is fixed, so changed counts mean changed detection results
+        for metric in ["raw_segments", "merged_lines"]:
+            if result[metric] != expected[metric]:
+                regressions.append(f"{key}: {metric} {result[metric]} != {expected[metric]}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark LineDetector on generated samples")
+    parser.add_argument('--img_sizes', type=int, nargs='+', default=[32, 64, 128, 256, 512, 1024], help="Sizes of the generated images in pixels")
+    parser.add_argument('--line_widths', type=int, nargs='+', default=[1, 3, 5], help="Widths of the drawn lines in pixels")
+    parser.add_argument('--modes', type=str, nargs='+', default=MODES, choices=MODES, help="Kinds of the generated shapes")
+    parser.add_argument('--num_images', type=int, default=20, help="Number of images per configuration")
+    parser.add_argument('--repeats', type=int, default=3, help="Number of passes over the images of a configuration")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for generated images")
+    parser.add_argument('--clustering', type=str, default=HoughBundler.CLUSTERING_GREEDY,
+                        choices=[HoughBundler.CLUSTERING_GREEDY, HoughBundler.CLUSTERING_GRID],
+                        help="Strategy of merging detected segments into lines")
+    parser.add_argument('--pyramid_min_size', type=int, default=0,
+                        help="Minimum image size in pixels to detect lines on the downscaled image first, 0 disables it")
+    parser.add_argument('--tile_size', type=int, default=0,
+                        help="Size of the tiles processed in parallel in pixels, 0 disables the tiling")
+    parser.add_argument('--output', type=str, default="", help="Path to save the results as a JSON baseline")
+    parser.add_argument('--baseline', type=str, default="", help="Path to a JSON baseline to compare the results with")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed relative slowdown against the baseline")
+    parser.add_argument('--min_delta_ms', type=float, default=0.5, help="Allowed absolute slowdown against the baseline")
+
+    args = parser.parse_args()
+
+    detector = LineDetector(
+        clustering=args.clustering, pyramid_min_size=args.pyramid_min_size, tile_size=args.tile_size
+    )
+    results = {}
+
+    print(
+        f"{'mode':>9} {'size':>5} {'width':>5} {'img/s':>9} {'p50, ms':>9} {'p99, ms':>9}"
+        f" {'bundle, ms':>10} {'raw':>7} {'merged':>7} {'peak, KB':>9}"
+    )
+    for mode in args.modes:
+        for img_size in args.img_sizes:
+            for line_width in args.line_widths:
+                with tempfile.TemporaryDirectory() as output_dir:
+                    images = generate_corpus(output_dir, mode, args.num_images, img_size, line_width, args.seed)
+
+                result = run_configuration(detector, images, args.repeats)
+                results[f"{mode}/{img_size}/{line_width}"] = result
+
+                print(
+                    f"{mode:>9} {img_size:>5} {line_width:>5} {result['throughput']:>9.1f} {result['p50_ms']:>9.2f}"
+                    f" {result['p99_ms']:>9.2f} {result['bundle_p50_ms']:>10.2f} {result['raw_segments']:>7}"
+                    f" {result['merged_lines']:>7} {result['peak_memory_kb']:>9.0f}"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "parameters": detector.get_parameters(),
+                    "seed": args.seed,
+                    "num_images": args.num_images,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"Results are saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        if baseline["parameters"] != detector.get_parameters() or baseline["seed"] != args.seed \
+                or baseline["num_images"] != args.num_images:
+            print("Baseline was recorded with different parameters, the results are not comparable")
+            sys.exit(2)
+
+        regressions = compare_with_baseline(baseline, results, args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
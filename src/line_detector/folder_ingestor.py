@@ -0,0 +1,113 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logging.basicConfig(level=logging.INFO)
+
+# Detector and detection cache of the worker process, set once by the pool initializer
+_worker_detector = None
+_worker_cache = None
+
+
+def _init_worker(detector, cache):
+    global _worker_detector, _worker_cache
+    _worker_detector = detector
+    _worker_cache = cache
+
+
+def _detect_lines(image_data):
+    return _worker_detector.detect_lines_in_bytes(image_data, _worker_cache)
+
+
+class FolderIngestor:
+    """Ingests images with a process pool for decoding and line detection
+    and a pool of writer threads behind a bounded queue for storing the results"""
+
+    _STOP = object()
+
+    def __init__(self, detector_workers, writer_workers, queue_size, detector, cache=None, write_batch_size=1):
+        self.detector_workers = detector_workers
+        self.writer_workers = writer_workers
+        self.queue_size = queue_size
+        self.detector = detector
+        self.cache = cache
+        # Maximum number of images passed to a single store call
+        self.write_batch_size = write_batch_size
+
+    def ingest(self, images, store_lines_batch):
+        """Detects lines on every image and passes them to store_lines_batch([(image_key, lines), ...])
+        from the writer threads. Returns the number of stored images.
+
+        Args:
+            images: iterable of (image_key, image_data) tuples, read lazily
+            store_lines_batch: callback storing the detected lines
+        """
+        results = queue.Queue(maxsize=self.queue_size)
+        stored_count = [0]
+        stored_count_lock = threading.Lock()
+
+        def write():
+            stopped = False
+            while not stopped:
+                batch = [results.get()]
+                # Takes whatever else is already waiting, without delaying the batch
+                while len(batch) < self.write_batch_size and batch[-1] is not self._STOP:
+                    try:
+                        batch.append(results.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if batch[-1] is self._STOP:
+                    stopped = True
+                    batch.pop()
+                if not batch:
+                    continue
+
+                try:
+                    store_lines_batch(batch)
+                    with stored_count_lock:
+                        stored_count[0] += len(batch)
+                except Exception as e:
+                    image_keys = [image_key for image_key, _ in batch]
+                    logging.error(f"Error storing lines for images {image_keys}: {e}")
+
+        writers = [threading.Thread(target=write, daemon=True) for _ in range(self.writer_workers)]
+        for writer in writers:
+            writer.start()
+
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.detector_workers,
+                initializer=_init_worker,
+                initargs=(self.detector, self.cache),
+            ) as executor:
+                # Limits the number of images read into memory ahead of the detectors
+                max_in_flight = self.detector_workers * 2
+                in_flight = []
+
+                for image_key, image_data in images:
+                    in_flight.append((image_key, executor.submit(_detect_lines, image_data)))
+
+                    if len(in_flight) >= max_in_flight:
+                        self._enqueue(results, *in_flight.pop(0))
+
+                for image_key, future in in_flight:
+                    self._enqueue(results, image_key, future)
+        finally:
+            for _ in writers:
+                results.put(self._STOP)
+            for writer in writers:
+                writer.join()
+
+        return stored_count[0]
+
+    @staticmethod
+    def _enqueue(results, image_key, future):
+        try:
+            lines = future.result()
+        except Exception as e:
+            logging.error(f"Error detecting lines for image {image_key}: {e}")
+            return
+        # Blocks when the writers fall behind the detectors
+        results.put((image_key, lines))
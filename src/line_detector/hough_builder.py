@@ -2,14 +2,34 @@ import numpy as np
 import math
 
 class HoughBundler:     
-    def __init__(self,min_distance=5,min_angle=2):
+    CLUSTERING_GREEDY = "greedy"
+    CLUSTERING_GRID = "grid"
+    # Maximum number of line pairs whose distances the vectorized greedy grouping computes at once,
+    # bounds its memory independently of the number of lines
+    DISTANCE_BLOCK_SIZE = 1 << 19
+
+    def __init__(self,min_distance=5,min_angle=2,vectorized=True,clustering=CLUSTERING_GREEDY):
+        if clustering not in (self.CLUSTERING_GREEDY, self.CLUSTERING_GRID):
+            raise ValueError(f"Unknown clustering mode: {clustering}")
+
         self.min_distance = min_distance
         self.min_angle = min_angle
+        # Vectorized path computes all pairwise distances and orientations at once with NumPy,
+        # the scalar path is kept as the reference implementation
+        self.vectorized = vectorized
+        # Greedy clustering depends on the order of lines, grid clustering merges every
+        # connected pair of close lines and does not depend on it
+        self.clustering = clustering
     
     def get_orientation(self, line):
         orientation = math.atan2(abs((line[3] - line[1])), abs((line[2] - line[0])))
         return math.degrees(orientation)
 
+    def get_orientations(self, lines):
+        lines = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+        orientations = np.arctan2(np.abs(lines[:, 3] - lines[:, 1]), np.abs(lines[:, 2] - lines[:, 0]))
+        return np.degrees(orientations)
+
     def check_is_line_different(self, line_1, groups, min_distance_to_merge, min_angle_to_merge):
         for group in groups:
             for line_2 in group:
@@ -54,6 +74,56 @@ class HoughBundler:
 
         return distance_point_to_line
 
+    def distances_points_to_lines(self, points, lines):
+        # Batched version of distance_point_to_line, returns a matrix of shape (len(points), len(lines))
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        lines = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+
+        return self._distance_points_to_lines(
+            points[:, 0, None], points[:, 1, None], *(lines[None, :, i] for i in range(4))
+        )
+
+    @staticmethod
+    def _distance_points_to_lines(px, py, x1, y1, x2, y2):
+        # Same formula as distance_point_to_line applied to broadcastable arrays
+        lmag = np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            u = (((px - x1) * (x2 - x1)) + ((py - y1) * (y2 - y1))) / (lmag * lmag)
+
+        # closest point does not fall within the line segment, take the shorter distance to an endpoint
+        distance_to_endpoints = np.minimum(
+            np.sqrt((x1 - px) ** 2 + (y1 - py) ** 2),
+            np.sqrt((x2 - px) ** 2 + (y2 - py) ** 2),
+        )
+        # intersecting point is on the line, use the formula
+        ix = x1 + u * (x2 - x1)
+        iy = y1 + u * (y2 - y1)
+        distance_to_projection = np.sqrt((ix - px) ** 2 + (iy - py) ** 2)
+
+        distances = np.where((u < 0.00001) | (u > 1), distance_to_endpoints, distance_to_projection)
+        return np.where(lmag < 0.00000001, 9999, distances)
+
+    def get_distance_matrix(self, lines):
+        # Symmetric matrix of get_distance values for every pair of lines
+        lines = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+        distances = np.minimum(
+            self.distances_points_to_lines(lines[:, :2], lines),
+            self.distances_points_to_lines(lines[:, 2:], lines),
+        )
+        return np.minimum(distances, distances.T)
+
+    def get_distances(self, a_lines, b_lines):
+        # get_distance for aligned arrays of line pairs, a_lines[i] is compared with b_lines[i]
+        a = np.asarray(a_lines, dtype=np.float64).reshape(-1, 4).T
+        b = np.asarray(b_lines, dtype=np.float64).reshape(-1, 4).T
+
+        return np.minimum.reduce([
+            self._distance_points_to_lines(a[0], a[1], *b),
+            self._distance_points_to_lines(a[2], a[3], *b),
+            self._distance_points_to_lines(b[0], b[1], *a),
+            self._distance_points_to_lines(b[2], b[3], *a),
+        ])
+
     def get_distance(self, a_line, b_line):
         dist1 = self.distance_point_to_line(a_line[:2], b_line)
         dist2 = self.distance_point_to_line(a_line[2:], b_line)
@@ -63,6 +133,11 @@ class HoughBundler:
         return min(dist1, dist2, dist3, dist4)
 
     def merge_lines_into_groups(self, lines):
+        if self.clustering == self.CLUSTERING_GRID:
+            return self.merge_lines_into_groups_grid(lines)
+        if self.vectorized:
+            return self.merge_lines_into_groups_vectorized(lines)
+
         groups = []  # all lines groups are here
         # first line will create new group every time
         groups.append([lines[0]])
@@ -73,6 +148,128 @@ class HoughBundler:
 
         return groups
 
+    def merge_lines_into_groups_vectorized(self, lines):
+        # Same greedy grouping as merge_lines_into_groups: a line joins the first group
+        # which has a close enough member, otherwise it creates a new group
+        groups = []
+        group_ids = np.empty(len(lines), dtype=np.intp)
+        for start, is_mergeable in self._iter_mergeable_blocks(lines):
+            for i in range(start, start + len(is_mergeable)):
+                candidate_group_ids = group_ids[:i][is_mergeable[i - start, :i]]
+                if len(candidate_group_ids) > 0:
+                    group_ids[i] = candidate_group_ids.min()
+                    groups[group_ids[i]].append(lines[i])
+                else:
+                    group_ids[i] = len(groups)
+                    groups.append([lines[i]])
+
+        return groups
+
+    def _iter_mergeable_blocks(self, lines):
+        # Yields (start, is_mergeable) for blocks of rows of the mergeable matrix, a block compares
+        # its lines only with the lines before its end, as the greedy grouping needs
+        lines = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+        orientations = self.get_orientations(lines)
+        rows = max(1, self.DISTANCE_BLOCK_SIZE // max(len(lines), 1))
+
+        for start in range(0, len(lines), rows):
+            end = min(start + rows, len(lines))
+            block, previous = lines[start:end], lines[:end]
+            distances = np.minimum(
+                np.minimum(
+                    self.distances_points_to_lines(block[:, :2], previous),
+                    self.distances_points_to_lines(block[:, 2:], previous),
+                ),
+                np.minimum(
+                    self.distances_points_to_lines(previous[:, :2], block),
+                    self.distances_points_to_lines(previous[:, 2:], block),
+                ).T,
+            )
+            yield start, (distances < self.min_distance) & (
+                np.abs(orientations[start:end, None] - orientations[None, :end]) < self.min_angle
+            )
+
+    def merge_lines_into_groups_grid(self, lines):
+        # Lines are put into a spatial grid with cells of min_distance size, so each line is compared only
+        # with lines passing through the nearby cells, close pairs are merged with union-find
+        lines_array = np.asarray(lines).reshape(-1, 4)
+        # canonical order makes the groups and their members independent of the input order
+        order = np.lexsort(lines_array.T[::-1])
+        lines = [lines[i] for i in order]
+        lines_array = lines_array[order].astype(np.float64)
+
+        line_ids_1, line_ids_2 = self._get_grid_candidate_pairs(lines_array)
+        orientations = self.get_orientations(lines_array)
+        is_mergeable = (self.get_distances(lines_array[line_ids_1], lines_array[line_ids_2]) < self.min_distance) & (
+            np.abs(orientations[line_ids_1] - orientations[line_ids_2]) < self.min_angle
+        )
+
+        parents = list(range(len(lines)))
+
+        def find(line_id):
+            while parents[line_id] != line_id:
+                parents[line_id] = parents[parents[line_id]]
+                line_id = parents[line_id]
+            return line_id
+
+        for line_id_1, line_id_2 in zip(line_ids_1[is_mergeable], line_ids_2[is_mergeable]):
+            root_1, root_2 = find(line_id_1), find(line_id_2)
+            if root_1 != root_2:
+                # the smallest line id stays the root, so groups keep the canonical order
+                parents[max(root_1, root_2)] = min(root_1, root_2)
+
+        groups = {}
+        for line_id, line in enumerate(lines):
+            groups.setdefault(find(line_id), []).append(line)
+
+        return list(groups.values())
+
+    def _get_grid_candidate_pairs(self, lines):
+        # A segment is sampled with a step of at most one cell, so an endpoint closer than min_distance
+        # to it always lies within two cells from one of the samples
+        cell_size = max(float(self.min_distance), 1.0)
+
+        lengths = np.hypot(lines[:, 2] - lines[:, 0], lines[:, 3] - lines[:, 1])
+        samples_count = np.ceil(lengths / cell_size).astype(np.intp) + 1
+        sample_line_ids = np.repeat(np.arange(len(lines)), samples_count)
+        sample_offsets = np.arange(len(sample_line_ids)) - np.repeat(np.cumsum(samples_count) - samples_count, samples_count)
+        t = sample_offsets / np.maximum(samples_count[sample_line_ids] - 1, 1)
+
+        start = lines[sample_line_ids, :2]
+        end = lines[sample_line_ids, 2:]
+        sample_cells = np.floor((start + (end - start) * t[:, None]) / cell_size).astype(np.int64)
+
+        # cells are encoded as single integers to join samples and endpoints with sorting
+        min_cell = np.floor(lines.reshape(-1, 2).min(axis=0) / cell_size).astype(np.int64) - 2
+        grid_height = int(np.floor(lines.reshape(-1, 2)[:, 1].max() / cell_size)) - int(min_cell[1]) + 3
+
+        def encode(cells):
+            return (cells[..., 0] - min_cell[0]) * grid_height + (cells[..., 1] - min_cell[1])
+
+        sample_keys = encode(sample_cells)
+        sample_keys, unique_ids = np.unique(sample_keys * len(lines) + sample_line_ids, return_index=True)
+        sample_line_ids = sample_line_ids[unique_ids]
+        sample_keys = sample_keys // len(lines)
+
+        neighbourhood = np.array([(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3)], dtype=np.int64)
+        endpoint_cells = np.floor(lines.reshape(-1, 2, 1, 2) / cell_size).astype(np.int64) + neighbourhood
+        query_keys = encode(endpoint_cells).reshape(len(lines), -1)
+        query_line_ids = np.repeat(np.arange(len(lines)), query_keys.shape[1])
+        query_keys = query_keys.ravel()
+
+        range_starts = np.searchsorted(sample_keys, query_keys, side="left")
+        range_counts = np.searchsorted(sample_keys, query_keys, side="right") - range_starts
+        line_ids = np.repeat(query_line_ids, range_counts)
+        other_line_ids = sample_line_ids[
+            np.repeat(range_starts - np.cumsum(range_counts) + range_counts, range_counts) + np.arange(range_counts.sum())
+        ]
+
+        is_pair = line_ids != other_line_ids
+        pair_keys = np.unique(
+            np.minimum(line_ids, other_line_ids)[is_pair] * len(lines) + np.maximum(line_ids, other_line_ids)[is_pair]
+        )
+        return pair_keys // len(lines), pair_keys % len(lines)
+
     def merge_line_segments(self, lines):
         orientation = self.get_orientation(lines[0])
       
@@ -0,0 +1,80 @@
+import gzip
+import struct
+
+# A single encoded image (bmp, png, jpeg, ...) as the request body
+CONTENT_TYPE_OCTET_STREAM = "application/octet-stream"
+# Several encoded images in one body, see encode_frames
+CONTENT_TYPE_FRAMES = "application/x-image-frames"
+
+# Frames body: magic, number of frames, then every frame as its length followed by the encoded image
+FRAMES_MAGIC = b"IMGF"
+FRAMES_HEADER = struct.Struct("<4sI")
+FRAME_LENGTH = struct.Struct("<I")
+
+
+def encode_frames(images):
+    """Packs the encoded images into a single CONTENT_TYPE_FRAMES body"""
+    parts = [FRAMES_HEADER.pack(FRAMES_MAGIC, len(images))]
+    for image_data in images:
+        parts.append(FRAME_LENGTH.pack(len(image_data)))
+        parts.append(image_data)
+    return b"".join(parts)
+
+
+def decode_frames(body):
+    """Splits a CONTENT_TYPE_FRAMES body into memoryviews of the encoded images without copying them.
+    Raises ValueError if the body is truncated or has data after the last frame."""
+    view = memoryview(body)
+    if len(view) < FRAMES_HEADER.size:
+        raise ValueError("Image frames body is shorter than its header")
+    magic, count = FRAMES_HEADER.unpack_from(view, 0)
+    if magic != FRAMES_MAGIC:
+        raise ValueError("Not an image frames body")
+
+    images = []
+    offset = FRAMES_HEADER.size
+    for _ in range(count):
+        if offset + FRAME_LENGTH.size > len(view):
+            raise ValueError("Image frame length exceeds the body")
+        (length,) = FRAME_LENGTH.unpack_from(view, offset)
+        offset += FRAME_LENGTH.size
+        if offset + length > len(view):
+            raise ValueError("Image frame exceeds the body")
+        images.append(view[offset:offset + length])
+        offset += length
+
+    if offset != len(view):
+        raise ValueError("Image frames body has data after the last frame")
+    return images
+
+
+def get_header(headers, name):
+    """Case-insensitive header lookup"""
+    for key, value in (headers or {}).items():
+        key = key.decode("utf-8") if isinstance(key, bytes) else key
+        if key.lower() == name.lower():
+            return value.decode("utf-8") if isinstance(value, bytes) else value
+    return None
+
+
+def decode_request_images(body, content_type, headers=None):
+    """Returns the encoded images of a binary request body as memoryviews,
+    or None if the request isn't binary and has to be handled as JSON.
+
+    Args:
+        body: request body
+        content_type: request content type, CONTENT_TYPE_OCTET_STREAM or CONTENT_TYPE_FRAMES
+        headers: request headers, a gzip Content-Encoding is decompressed
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type not in (CONTENT_TYPE_OCTET_STREAM, CONTENT_TYPE_FRAMES):
+        return None
+    if not isinstance(body, (bytes, bytearray, memoryview)):
+        return None
+
+    if (get_header(headers, "Content-Encoding") or "").strip().lower() == "gzip":
+        body = gzip.decompress(body)
+
+    if media_type == CONTENT_TYPE_FRAMES:
+        return decode_frames(body)
+    return [memoryview(body)]
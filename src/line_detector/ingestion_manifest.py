@@ -0,0 +1,70 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+class IngestionManifest:
+    """Persistent local record of the ingested images, keyed by the hash of the image content.
+    Lets a restarted folder ingestion skip finished images and resume the partial ones."""
+
+    # The image_id is assigned, lines may or may not be stored
+    STAGE_PENDING = "pending"
+    # Lines are stored in Neo4j
+    STAGE_STORED = "stored"
+    # The next functions are called for the image
+    STAGE_FORWARDED = "forwarded"
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS images (
+                    content_hash TEXT PRIMARY KEY,
+                    image_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    image_file TEXT,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    @staticmethod
+    def hash_content(image_data):
+        return hashlib.sha256(image_data).hexdigest()
+
+    def get(self, content_hash):
+        """Returns (image_id, stage) of the image or None if the image wasn't ingested yet"""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT image_id, stage FROM images WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+
+    def set_stage(self, entries, stage):
+        """Records the stage for a list of (content_hash, image_id, image_file) entries"""
+        updated_at = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                """
+                INSERT INTO images (content_hash, image_id, stage, image_file, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (content_hash) DO UPDATE SET
+                    image_id = excluded.image_id,
+                    stage = excluded.stage,
+                    image_file = excluded.image_file,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (content_hash, str(image_id), stage, image_file, updated_at)
+                    for content_hash, image_id, image_file in entries
+                ],
+            )
+            self.connection.execute("COMMIT")
@@ -2,43 +2,279 @@ import numpy as np
 import os
 import cv2
 import argparse
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
 
 from hough_builder import HoughBundler
 
 
 class LineDetector:
+    def __init__(
+        self,
+        clustering=HoughBundler.CLUSTERING_GREEDY,
+        rho=1,
+        theta=np.pi / 180,
+        threshold=15,
+        min_line_length=5,
+        max_line_gap=1,
+        min_distance=10,
+        min_angle=10,
+        pyramid_min_size=0,
+        pyramid_size=512,
+        pyramid_margin=3,
+        tile_size=0,
+        tile_overlap=32,
+        tile_workers=4,
+    ):
+        self.clustering = clustering
+        # HoughLinesP parameters
+        self.rho = rho
+        self.theta = theta
+        self.threshold = threshold
+        self.min_line_length = min_line_length
+        self.max_line_gap = max_line_gap
+        # HoughBundler parameters
+        self.min_distance = min_distance
+        self.min_angle = min_angle
+        # Images with the longest side of at least pyramid_min_size pixels are searched for candidate lines
+        # downscaled to pyramid_size pixels and refined at full resolution within pyramid_margin pixels
+        # around the candidates. 0 disables the pyramid mode.
+        self.pyramid_min_size = pyramid_min_size
+        self.pyramid_size = pyramid_size
+        self.pyramid_margin = pyramid_margin
+        # Images with the longest side above tile_size pixels are split into tiles overlapping by tile_overlap pixels,
+        # which are processed by tile_workers threads. 0 disables the tiled mode.
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_workers = tile_workers
+
+    def get_parameters(self):
+        return {
+            "clustering": self.clustering,
+            "rho": self.rho,
+            "theta": self.theta,
+            "threshold": self.threshold,
+            "min_line_length": self.min_line_length,
+            "max_line_gap": self.max_line_gap,
+            "min_distance": self.min_distance,
+            "min_angle": self.min_angle,
+            "pyramid_min_size": self.pyramid_min_size,
+            "pyramid_size": self.pyramid_size,
+            "pyramid_margin": self.pyramid_margin,
+            "tile_size": self.tile_size,
+            "tile_overlap": self.tile_overlap,
+        }
+
+    def get_parameters_digest(self):
+        parameters = json.dumps(self.get_parameters(), sort_keys=True)
+        return hashlib.sha256(parameters.encode("utf-8")).hexdigest()[:16]
+
+    def detect_lines_in_bytes(self, image_data, cache=None):
+        """Decodes the encoded image and detects lines on it. With a DetectionCache,
+        lines detected earlier for the same content and parameters are returned without decoding."""
+        if cache is not None:
+            content_hash = hashlib.sha256(image_data).hexdigest()
+            parameters_digest = self.get_parameters_digest()
+            lines = cache.get(content_hash, parameters_digest)
+            if lines is not None:
+                return lines
+
+        np_data = np.frombuffer(image_data, np.uint8)
+        # The pyramid mode works on grayscale only, decoding straight to it skips the color conversion
+        image = cv2.imdecode(np_data, cv2.IMREAD_GRAYSCALE if self.pyramid_min_size else cv2.IMREAD_UNCHANGED)
+        lines = self.detect_lines(image)
+
+        if cache is not None:
+            cache.put(content_hash, parameters_digest, lines)
+        return lines
+
     def detect_lines(self, image):
-        # Convert the image to grayscale if it's not already
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image
+        lines = self.detect_raw_lines(image)
 
-        lines = cv2.HoughLinesP(gray, 1, np.pi / 180, threshold=15, lines=None, minLineLength=5, maxLineGap=1)
-        
         # Check if lines is None
         if lines is None:
             print("No lines found")
             return []
-        
-        # Initialize HoughBundler
-        bundler = HoughBundler(min_distance=10, min_angle=10)
-        
+
         # Process lines
-        processed_lines = bundler.process_lines(lines)
+        processed_lines = self.bundle_lines(lines)
 
         print(f"Pre-processed lines found: {len(lines)}")
         print(f"Post-processed lines: {len(processed_lines)}")
         return processed_lines
 
+    def detect_raw_lines(self, image):
+        """Returns the segments found by HoughLinesP before merging, None if there are no segments"""
+        # Convert the image to grayscale if it's not already
+        if len(image.shape) == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = image
+
+        if self.pyramid_min_size and max(gray.shape) >= self.pyramid_min_size:
+            return self.detect_raw_lines_pyramid(gray)
+        if self.tile_size and max(gray.shape) > self.tile_size:
+            return self.detect_raw_lines_tiled(gray)
+
+        return cv2.HoughLinesP(
+            gray,
+            self.rho,
+            self.theta,
+            threshold=self.threshold,
+            lines=None,
+            minLineLength=self.min_line_length,
+            maxLineGap=self.max_line_gap,
+        )
+
+    def detect_raw_lines_pyramid(self, gray):
+        """Finds candidate lines on the downscaled image and refines their endpoints
+        on the full resolution pixels lying within pyramid_margin pixels of every candidate"""
+        scale = self.pyramid_size / max(gray.shape)
+        # INTER_AREA averages the pixels, so thin lines stay visible on the downscaled image
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        # The thresholds are not scaled down, lower ones turn the antialiased edges into candidates
+        candidates = cv2.HoughLinesP(
+            small,
+            self.rho,
+            self.theta,
+            threshold=self.threshold,
+            lines=None,
+            minLineLength=self.min_line_length,
+            maxLineGap=self.max_line_gap,
+        )
+        if candidates is None:
+            return None
+
+        # Merging the candidates first refines every line once instead of once per segment
+        bundler = HoughBundler(
+            min_distance=max(1, self.min_distance * scale), min_angle=self.min_angle, clustering=self.clustering
+        )
+        candidates = np.asarray(bundler.process_lines(candidates), dtype=np.float64).reshape(-1, 4) / scale
+
+        # A downscaled pixel covers 1 / scale pixels of the full image
+        margin = self.pyramid_margin + int(np.ceil(1 / scale))
+        height, width = gray.shape
+        refined_lines = []
+
+        for x1, y1, x2, y2 in candidates:
+            length = np.hypot(x2 - x1, y2 - y1)
+            if length == 0:
+                continue
+            direction = np.array([x2 - x1, y2 - y1]) / length
+            normal = np.array([-direction[1], direction[0]])
+
+            # Samples the band around the candidate pixel by pixel, so the cost doesn't depend on the image size
+            along = np.arange(-margin, length + margin + 1)
+            across = np.arange(-margin, margin + 1)
+            samples = (
+                np.array([x1, y1])
+                + along[:, None, None] * direction
+                + across[None, :, None] * normal
+            ).reshape(-1, 2)
+            samples = np.rint(samples).astype(np.int64)
+
+            samples = samples[
+                (samples[:, 0] >= 0) & (samples[:, 0] < width) & (samples[:, 1] >= 0) & (samples[:, 1] < height)
+            ]
+            # Pixels sampled twice due to rounding only add a little weight to the fit
+            band_points = samples[gray[samples[:, 1], samples[:, 0]] > 0].astype(np.float64)
+            if len(band_points) < 2:
+                continue
+
+            # Least squares fit, refitted without the pixels of crossing lines left far from the first fit
+            center, fit_direction = LineDetector._fit_line(band_points)
+            inliers = np.abs((band_points - center) @ [-fit_direction[1], fit_direction[0]]) <= self.pyramid_margin
+            if np.count_nonzero(inliers) >= 2:
+                band_points = band_points[inliers]
+                center, fit_direction = LineDetector._fit_line(band_points)
+
+            projections = (band_points - center) @ fit_direction
+            start = center + fit_direction * projections.min()
+            end = center + fit_direction * projections.max()
+            refined_lines.append([[start[0], start[1], end[0], end[1]]])
+
+        if not refined_lines:
+            return None
+        refined_lines = np.rint(refined_lines)
+        refined_lines[..., 0::2] = np.clip(refined_lines[..., 0::2], 0, width - 1)
+        refined_lines[..., 1::2] = np.clip(refined_lines[..., 1::2], 0, height - 1)
+        return refined_lines.astype(np.int32)
+
+    def detect_raw_lines_tiled(self, gray):
+        """Detects and merges lines on every tile in parallel. Returns the merged lines of all tiles
+        in image coordinates, the lines split by the tile seams are stitched by the final bundling."""
+        height, width = gray.shape
+        step = max(1, self.tile_size - self.tile_overlap)
+        tiles = [
+            (left, top)
+            for top in range(0, max(1, height - self.tile_overlap), step)
+            for left in range(0, max(1, width - self.tile_overlap), step)
+        ]
+
+        def detect_tile_lines(tile):
+            left, top = tile
+            # HoughLinesP releases the GIL, so the tiles are processed in parallel by threads
+            lines = cv2.HoughLinesP(
+                gray[top:top + self.tile_size, left:left + self.tile_size],
+                self.rho,
+                self.theta,
+                threshold=self.threshold,
+                lines=None,
+                minLineLength=self.min_line_length,
+                maxLineGap=self.max_line_gap,
+            )
+            if lines is None:
+                return None
+            return self.bundle_lines(lines) + np.array([left, top, left, top], dtype=lines.dtype)
+
+        with ThreadPoolExecutor(max_workers=self.tile_workers) as executor:
+            tile_lines = [lines for lines in executor.map(detect_tile_lines, tiles) if lines is not None]
+
+        if not tile_lines:
+            return None
+        return np.concatenate(tile_lines)
+
+    @staticmethod
+    def _fit_line(points):
+        """Returns the centroid and the unit direction of the least squares line through the points"""
+        center = points.mean(axis=0)
+        # The direction is the principal axis of the point cloud
+        _, eigenvectors = np.linalg.eigh(np.cov(points - center, rowvar=False))
+        return center, eigenvectors[:, -1]
+
+    def bundle_lines(self, lines):
+        """Merges the raw segments into lines"""
+        # Initialize HoughBundler
+        bundler = HoughBundler(min_distance=self.min_distance, min_angle=self.min_angle, clustering=self.clustering)
+
+        return bundler.process_lines(lines)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Detect lines in an image")
     parser.add_argument('--folder_path', type=str, default="", help="Path to the folder containing images")
+    parser.add_argument('--clustering', type=str, default=HoughBundler.CLUSTERING_GREEDY,
+                        choices=[HoughBundler.CLUSTERING_GREEDY, HoughBundler.CLUSTERING_GRID],
+                        help="Strategy of merging detected segments into lines")
+    parser.add_argument('--pyramid_min_size', type=int, default=0,
+                        help="Minimum image size in pixels to detect lines on the downscaled image first, 0 disables it")
+    parser.add_argument('--pyramid_size', type=int, default=512,
+                        help="Size of the downscaled image in pixels")
+    parser.add_argument('--tile_size', type=int, default=0,
+                        help="Size of the tiles processed in parallel in pixels, 0 disables the tiling")
+    parser.add_argument('--tile_workers', type=int, default=4, help="Number of threads processing the tiles")
     
     args = parser.parse_args()
     
-    detector = LineDetector()
+    detector = LineDetector(
+        clustering=args.clustering,
+        pyramid_min_size=args.pyramid_min_size,
+        pyramid_size=args.pyramid_size,
+        tile_size=args.tile_size,
+        tile_workers=args.tile_workers,
+    )
     
     folder_path = args.folder_path
     image_files = os.listdir(folder_path)
@@ -4,46 +4,95 @@ from neo4j import GraphDatabase
 
 
 class LinesRepository:
-    def __init__(self, uri, user, password):
+    # The query text is constant, so Neo4j plans it once and reuses the cached plan for every image
+    ADD_LINES_QUERY = """
+        UNWIND $lines AS line
+        CREATE (l:Line {image_id: line.image_id, id: line.id})
+
+        CREATE (length:Length {line_id: line.line_id})
+        CREATE (absolute:Absolute {line_id: line.line_id, value: line.length})
+        CREATE (l)-[:HAS_LENGTH]->(length)
+        CREATE (length)-[:HAS_ABSOLUTE]->(absolute)
+
+        CREATE (orientation:Orientation {line_id: line.line_id})
+        CREATE (angle:Angle {line_id: line.line_id, value: line.angle})
+        CREATE (l)-[:HAS_ORIENTATION]->(orientation)
+        CREATE (orientation)-[:HAS_ANGLE]->(angle)
+
+        CREATE (location:Location {line_id: line.line_id})
+        CREATE (coordinates:Coordinates {line_id: line.line_id, x1: line.x1, y1: line.y1, x2: line.x2, y2: line.y2})
+        CREATE (l)-[:HAS_LOCATION]->(location)
+        CREATE (location)-[:HAS_COORDINATES]->(coordinates)
+    """
+
+    def __init__(self, uri, user, password, chunk_size=1000):
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        # Maximum number of lines created by a single statement
+        self.chunk_size = chunk_size
 
     def close(self):
         self.driver.close()
 
     def add_lines(self, lines, image_id):
+        return self.add_lines_batch([(lines, image_id)])
+
+    def add_lines_batch(self, images):
+        """Stores lines of several images in one transaction
+
+        Args:
+            images: list of (lines, image_id) tuples
+        """
+        rows = [
+            row
+            for lines, image_id in images
+            for row in LinesRepository.get_line_rows(lines, image_id)
+        ]
         with self.driver.session() as session:
-            result = session.execute_write(self._execute_add_lines_query, lines, image_id)
+            result = session.execute_write(LinesRepository.write_lines, rows, self.chunk_size)
         return result
 
+    def has_lines(self, image_id):
+        with self.driver.session() as session:
+            return session.execute_read(self._execute_has_lines_query, image_id)
+
+    @staticmethod
+    def _execute_has_lines_query(tx, image_id):
+        query = """
+            MATCH (l:Line {image_id: $image_id})
+            RETURN count(l) > 0 AS has_lines
+        """
+        return tx.run(query, image_id=str(image_id)).single()["has_lines"]
+
     @staticmethod
-    def _execute_add_lines_query(tx, lines, image_id):
-        query = ""
+    def write_lines(tx, rows, chunk_size):
+        """Creates the lines of the rows of get_line_rows in the transaction, chunk_size lines per statement"""
+        for start in range(0, len(rows), chunk_size):
+            tx.run(LinesRepository.ADD_LINES_QUERY, lines=rows[start : start + chunk_size])
+        return len(rows)
+
+    @staticmethod
+    def get_line_rows(lines, image_id):
+        """Returns the parameters of ADD_LINES_QUERY for the lines of the image"""
+        rows = []
         for line_id, line in enumerate(lines):
             for x1, y1, x2, y2 in line:
-                query += f"""
-                (l{line_id}:Line {{image_id:'{image_id}', id: {line_id}}}), 
-                
-                (length{line_id}:Length {{line_id:'{line_id}'}}), 
-                (absolute{line_id}:Absolute {{line_id:'{line_id}', value:{round(math.dist([x1, y1], [x2, y2]))}}}), 
-                (l{line_id})-[:HAS_LENGTH]->(length{line_id}), 
-                (length{line_id})-[:HAS_ABSOLUTE]->(absolute{line_id}), 
-            
-                (orientation{line_id}:Orientation {{line_id:'{line_id}'}}),
-                (angle{line_id}:Angle {{line_id:'{line_id}', value:{LinesRepository.calculate_angle(x1, y1, x2, y2)}}}), 
-                (l{line_id})-[:HAS_ORIENTATION]->(orientation{line_id}), 
-                (orientation{line_id})-[:HAS_ANGLE]->(angle{line_id}),
-                
-                (location{line_id}:Location {{line_id:'{line_id}'}}),
-                (coordinates{line_id}:Coordinates {{line_id:'{line_id}', x1:{x1}, y1:{y1}, x2:{x2}, y2:{y2}}}),
-                (l{line_id})-[:HAS_LOCATION]->(location{line_id}), 
-                (location{line_id})-[:HAS_COORDINATES]->(coordinates{line_id}),
-                """
-
-        result = tx.run(f"CREATE {query.strip().strip(',')}")
-        return result
-                    
+                # Detected coordinates are NumPy integers which the driver can't serialize
+                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+                rows.append({
+                    "image_id": str(image_id),
+                    "id": line_id,
+                    "line_id": str(line_id),
+                    "length": round(math.dist([x1, y1], [x2, y2])),
+                    "angle": LinesRepository.calculate_angle(x1, y1, x2, y2),
+                    "x1": x1,
+                    "y1": y1,
+                    "x2": x2,
+                    "y2": y2,
+                })
+        return rows
+
     @staticmethod
     def calculate_angle(x1, y1, x2, y2):
         angle_radians = math.atan2(y2 - y1, x2 - x1)
         angle_degrees = math.degrees(angle_radians)
-        return abs(angle_degrees)
\ No newline at end of file
+        return abs(angle_degrees)
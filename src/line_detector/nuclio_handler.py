@@ -2,12 +2,17 @@ import base64
 import os
 import glob
 
-import requests
-import numpy as np
-import cv2
 import uuid
+from collections import namedtuple
 from lines_repository import LinesRepository
 from line_detector import LineDetector
+from folder_ingestor import FolderIngestor
+from ingestion_manifest import IngestionManifest
+from detection_cache import DetectionCache
+from downstream_dispatcher import DownstreamDispatcher
+from schema_bootstrap import bootstrap_schema
+from image_transport import decode_request_images
+from stage_payload import build_stage_payload
 
 from pydantic_settings import BaseSettings
 
@@ -15,6 +20,9 @@ from pydantic_settings import BaseSettings
 HANDLER_NAME = "Line Detector"
 MAX_IMAGES = float("inf")
 
+# Image of the input_folder request, content_hash and image_id are known only for the resumable ingestion
+FolderImage = namedtuple("FolderImage", ["image_file", "content_hash", "image_id"])
+
 
 class Settings(BaseSettings):
     """Settings"""
@@ -23,6 +31,33 @@ class Settings(BaseSettings):
     neo4j_user: str
     neo4j_pass: str
     next_nuclio: str = ""
+    # Timeout of the next function calls in seconds
+    next_nuclio_timeout: float = 600
+    # Don't wait for the responses of the next functions
+    next_nuclio_fire_and_forget: bool = False
+    next_nuclio_max_in_flight: int = 16
+    # Create the missing indexes and constraints of the graph database on start
+    schema_bootstrap: bool = True
+    line_clustering: str = "greedy"
+    # Images with the longest side of at least this size are searched for lines downscaled first, 0 disables it
+    line_pyramid_min_size: int = 0
+    line_pyramid_size: int = 512
+    # Images with the longest side above this size are split into tiles processed in parallel, 0 disables it
+    line_tile_size: int = 0
+    line_tile_workers: int = 4
+    # Number of processes detecting lines for the input_folder requests, 1 processes images serially
+    ingest_workers: int = 1
+    ingest_writers: int = 4
+    ingest_queue_size: int = 64
+    # Number of images stored in one transaction by the parallel ingestion
+    ingest_write_batch_size: int = 1
+    # Path to the local manifest of ingested images, makes input_folder requests resumable when set
+    ingest_manifest_path: str = ""
+    # Directory of the on-disk cache of detected lines, the cache is disabled when empty
+    detection_cache_path: str = ""
+    detection_cache_max_size_mb: int = 1024
+    # Forward the detected lines with the image ids, so the next stage doesn't read them from Neo4j
+    stage_handoff: bool = False
 
 
 def init_context(context):
@@ -39,8 +74,41 @@ def init_context(context):
         Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass
     )
     setattr(context.user_data, "lines_repository", lines_repository)
+    setattr(
+        context.user_data,
+        "line_detector",
+        LineDetector(
+            clustering=Settings().line_clustering,
+            pyramid_min_size=Settings().line_pyramid_min_size,
+            pyramid_size=Settings().line_pyramid_size,
+            tile_size=Settings().line_tile_size,
+            tile_workers=Settings().line_tile_workers,
+        ),
+    )
+
+    detection_cache = None
+    if Settings().detection_cache_path:
+        detection_cache = DetectionCache(
+            Settings().detection_cache_path,
+            Settings().detection_cache_max_size_mb * 1024 * 1024,
+        )
+    setattr(context.user_data, "detection_cache", detection_cache)
+
+    if Settings().schema_bootstrap:
+        bootstrap_schema(Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass)
 
     setattr(context.user_data, "next_nuclio", Settings().next_nuclio)
+    setattr(
+        context.user_data,
+        "downstream_dispatcher",
+        DownstreamDispatcher(
+            Settings().next_nuclio,
+            timeout=Settings().next_nuclio_timeout,
+            fire_and_forget=Settings().next_nuclio_fire_and_forget,
+            max_in_flight=Settings().next_nuclio_max_in_flight,
+        ),
+    )
+    setattr(context.user_data, "settings", Settings())
 
 
 def http_handler(context, event):
@@ -48,27 +116,36 @@ def http_handler(context, event):
     try:
         data = event.body
         images_count = 0
+        # Images sent as binary bodies are decoded without the base64 step
+        binary_images = decode_request_images(data, event.content_type, event.headers)
+
+        if binary_images is not None:
+            if len(binary_images) == 1:
+                process_image(context, binary_images[0])
+            else:
+                process_images(context, binary_images)
 
         # Check if 'input_folder' key exists in the data and is not empty
-        if "input_folder" in data and data["input_folder"]:
+        elif "input_folder" in data and data["input_folder"]:
             input_folder = data["input_folder"]
             image_files = glob.glob(os.path.join(input_folder, "*"))
 
-            for image_file in image_files:
-                if images_count >= MAX_IMAGES:
-                    context.logger.info(
-                        f"Reached maximum number of images: {MAX_IMAGES}"
-                    )
-                    break
+            if len(image_files) > MAX_IMAGES:
+                context.logger.info(f"Reached maximum number of images: {MAX_IMAGES}")
+                image_files = image_files[: int(MAX_IMAGES)]
 
-                with open(image_file, "rb") as f:
-                    image_data = f.read()
+            workers = int(data.get("workers", context.user_data.settings.ingest_workers))
+            if workers < 1:
+                context.logger.error(f"Invalid number of workers in request: {workers}")
+                return
+            images_count = ingest_folder(context, image_files, workers)
 
-                context.logger.info(f"Processing image: {image_file}")
-                process_image(context, image_data)
-                images_count += 1
+            context.logger.info(f"Processed {images_count} images")
 
-            context.logger.info(f"Processed {len(image_files)} images")
+        # A batch of images is stored in one transaction and forwarded in one call
+        elif "images" in data and data["images"]:
+            images_data = [base64.b64decode(image) for image in data["images"]]
+            process_images(context, images_data)
 
         # If 'input_folder' key doesn't exist, check for 'image' key
         elif "image" in data and data["image"]:
@@ -104,34 +181,164 @@ def handler(context, event):
         )
 
 
+def ingest_folder(context, image_files, workers):
+    settings = context.user_data.settings
+
+    manifest = None
+    if settings.ingest_manifest_path:
+        manifest = IngestionManifest(settings.ingest_manifest_path)
+
+    try:
+        images = read_folder_images(context, image_files, manifest)
+
+        if workers > 1:
+            context.logger.info(
+                f"Processing {len(image_files)} images with {workers} detectors and {settings.ingest_writers} writers"
+            )
+            ingestor = FolderIngestor(
+                detector_workers=workers,
+                writer_workers=settings.ingest_writers,
+                queue_size=settings.ingest_queue_size,
+                detector=context.user_data.line_detector,
+                cache=context.user_data.detection_cache,
+                write_batch_size=settings.ingest_write_batch_size,
+            )
+            return ingestor.ingest(
+                images, lambda batch: store_folder_images(context, batch, manifest)
+            )
+
+        images_count = 0
+        for folder_image, image_data in images:
+            context.logger.info(f"Processing image: {folder_image.image_file}")
+            lines = detect_lines(context, image_data)
+            store_folder_images(context, [(folder_image, lines)], manifest)
+            images_count += 1
+        return images_count
+
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+
+def read_folder_images(context, image_files, manifest):
+    """Yields (FolderImage, image_data) for the images which still need line detection.
+    Images stored by a previous run are only forwarded, finished images are skipped."""
+    for image_file in image_files:
+        with open(image_file, "rb") as f:
+            image_data = f.read()
+
+        if manifest is None:
+            yield FolderImage(image_file, None, None), image_data
+            continue
+
+        content_hash = IngestionManifest.hash_content(image_data)
+        entry = manifest.get(content_hash)
+
+        if entry is None:
+            yield FolderImage(image_file, content_hash, None), image_data
+            continue
+
+        image_id, stage = entry
+        if stage == IngestionManifest.STAGE_FORWARDED:
+            context.logger.info(f"Skipping processed image: {image_file} as {image_id}")
+        elif stage == IngestionManifest.STAGE_STORED or context.user_data.lines_repository.has_lines(image_id):
+            context.logger.info(f"Resuming stored image: {image_file} as {image_id}")
+            forward_images(context, [image_id])
+            manifest.set_stage([(content_hash, image_id, image_file)], IngestionManifest.STAGE_FORWARDED)
+        else:
+            # The previous run crashed before storing the lines, the image keeps its image_id
+            yield FolderImage(image_file, content_hash, image_id), image_data
+
+
+def store_folder_images(context, batch, manifest):
+    folder_images = [folder_image for folder_image, _ in batch]
+    image_ids = [folder_image.image_id or uuid.uuid4() for folder_image in folder_images]
+    manifest_entries = [
+        (folder_image.content_hash, image_id, folder_image.image_file)
+        for folder_image, image_id in zip(folder_images, image_ids)
+    ]
+
+    if manifest is not None:
+        manifest.set_stage(manifest_entries, IngestionManifest.STAGE_PENDING)
+
+    lines_batch = [lines for _, lines in batch]
+    store_lines_batch(context, lines_batch, image_ids)
+    if manifest is not None:
+        manifest.set_stage(manifest_entries, IngestionManifest.STAGE_STORED)
+
+    forward_images(context, image_ids, lines_batch)
+    if manifest is not None:
+        manifest.set_stage(manifest_entries, IngestionManifest.STAGE_FORWARDED)
+
+    for folder_image, image_id in zip(folder_images, image_ids):
+        context.logger.info(f"Processed image: {folder_image.image_file} as {image_id}")
+
+
 def process_image(context, image_data):
-    np_data = np.frombuffer(image_data, np.uint8)
-    image = cv2.imdecode(np_data, cv2.IMREAD_UNCHANGED)
+    lines = detect_lines(context, image_data)
 
     image_id = uuid.uuid4()
+    store_lines_batch(context, [lines], [image_id])
+    forward_images(context, [image_id], [lines])
 
-    lines = LineDetector().detect_lines(image)
-    context.logger.info(f"Detected {len(lines)} lines for image: {image_id}")
-    context.user_data.lines_repository.add_lines(lines, image_id)
+    context.Response(
+        body=f"Lines detected for image: {image_id}",
+        headers={},
+        content_type="text/plain",
+    )
 
-    next_functions_str = context.user_data.next_nuclio
 
-    if next_functions_str:
-        next_nuclio = next_functions_str.split(";")
-        context.logger.debug_with(
-            f"Next functions: {next_nuclio}", handler=HANDLER_NAME
-        )
+def process_images(context, images_data):
+    lines_batch = [detect_lines(context, image_data) for image_data in images_data]
 
-        if len(next_nuclio) > 0:
-            for func in next_nuclio:
-                context.logger.info_with(f"Calling {func}", handler=HANDLER_NAME)
-                response = requests.post(func, json=str(image_id))
-                context.logger.info_with(
-                    f"Response: {response.status_code}", handler=HANDLER_NAME
-                )
+    image_ids = [uuid.uuid4() for _ in lines_batch]
+    store_lines_batch(context, lines_batch, image_ids)
+    forward_image_batch(context, image_ids, lines_batch)
 
     context.Response(
-        body=f"Lines detected for image: {image_id}",
+        body=f"Lines detected for images: {', '.join(str(image_id) for image_id in image_ids)}",
         headers={},
         content_type="text/plain",
     )
+
+
+def detect_lines(context, image_data):
+    return context.user_data.line_detector.detect_lines_in_bytes(
+        image_data, context.user_data.detection_cache
+    )
+
+
+def store_lines_batch(context, lines_batch, image_ids):
+    for lines, image_id in zip(lines_batch, image_ids):
+        context.logger.info(f"Detected {len(lines)} lines for image: {image_id}")
+    context.user_data.lines_repository.add_lines_batch(list(zip(lines_batch, image_ids)))
+
+
+def forward_images(context, image_ids, lines_batch=None):
+    responses = context.user_data.downstream_dispatcher.dispatch_many(
+        get_stage_payloads(context, image_ids, lines_batch)
+    )
+    for func, status_code in responses:
+        context.logger.info_with(f"Response from {func}: {status_code}", handler=HANDLER_NAME)
+
+
+def forward_image_batch(context, image_ids, lines_batch=None):
+    responses = context.user_data.downstream_dispatcher.dispatch(
+        get_stage_payloads(context, image_ids, lines_batch)
+    )
+    for func, status_code in responses:
+        context.logger.info_with(f"Response from {func}: {status_code}", handler=HANDLER_NAME)
+
+
+def get_stage_payloads(context, image_ids, lines_batch):
+    """Returns the image ids, or the payloads with the lines of the images when the stage handoff is enabled"""
+    if not context.user_data.settings.stage_handoff or lines_batch is None:
+        return [str(image_id) for image_id in image_ids]
+
+    return [
+        build_stage_payload(
+            image_id,
+            lines=[[int(x1), int(y1), int(x2), int(y2)] for line in lines for x1, y1, x2, y2 in line],
+        )
+        for lines, image_id in zip(lines_batch, image_ids)
+    ]
@@ -0,0 +1,302 @@
+import argparse
+import contextlib
+import glob
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from neo4j import GraphDatabase
+
+# The functions are deployed from their own directories and import their modules by name
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+for function_dir in ["line_detector", "angle_point_detector", "vector_characteristics_definer", "contour_analysis",
+                     "clean_up", "samples_generator"]:
+    sys.path.append(os.path.join(SRC_DIR, function_dir))
+
+from angle_points_repository import AnglePointsRepository  # noqa: E402
+from clean_up_repository import Neo4jRepository  # noqa: E402
+from detection_cache import DetectionCache  # noqa: E402
+from hough_builder import HoughBundler  # noqa: E402
+from line_detector import LineDetector  # noqa: E402
+from lines_repository import LinesRepository  # noqa: E402
+from contour_analysis_repository import ContourAnalysisRepository  # noqa: E402
+from logic.contour_engine import build_contour_graph, load_contour_graph, walk_contour, write_contour  # noqa: E402
+from logic.contour_traverse import find_starting_point, traverse_contour  # noqa: E402
+from logic.exposition_analyzer import analyze_exposition  # noqa: E402
+from logic.shared_nodes import load_shared_nodes  # noqa: E402
+from logic.structural_elements import record_structural_elements  # noqa: E402
+from relative_characteristics_repository import VectorCharacteristicsRepository  # noqa: E402
+from samples_generator import generate_triangle_images  # noqa: E402
+from schema_bootstrap import bootstrap_schema  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+
+
+class PipelineRunner:
+    """Runs line_detector, angle_point_detector, vector_characteristics_definer and contour_analysis
+    for every image in one process. The lines stay in memory between the stages and every group
+    of images is written in one transaction, without the HTTP calls between the functions.
+    As in the contour_analysis function, the contour of every image is analyzed in its own transaction."""
+
+    def __init__(
+        self,
+        uri,
+        user,
+        password,
+        line_detector,
+        intersection_mode=AnglePointsRepository.INTERSECTION_MODE_LINE,
+        intersection_extension=10,
+        vector_construction=VectorCharacteristicsRepository.VECTOR_CONSTRUCTION_PYTHON,
+        contour_engine=ContourAnalysisRepository.CONTOUR_ENGINE_MEMORY,
+        group_size=1,
+        cache=None,
+    ):
+        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        self.line_detector = line_detector
+        self.intersection_mode = intersection_mode
+        self.intersection_extension = intersection_extension
+        self.clean_up_repository = Neo4jRepository(uri, user, password)
+        self.vector_construction = vector_construction
+        self.contour_engine = contour_engine
+        # Number of images written in one transaction
+        self.group_size = group_size
+        self.cache = cache
+        # Sketch node of the structural element counts written by the runner
+        self.sketch_id = str(uuid.uuid4())
+        # Maximum number of lines created by a single statement, as in LinesRepository
+        self.lines_chunk_size = 1000
+
+    def close(self):
+        self.clean_up_repository.close()
+        self.driver.close()
+
+    def run(self, images):
+        """Processes the images and returns their number
+
+        Args:
+            images: iterable of (name, image_data) with the encoded images, e.g. iter_folder_images
+        """
+        images_count = 0
+        group = []
+        for name, image_data in images:
+            # detect_lines reports the counts of every image
+            with contextlib.redirect_stdout(io.StringIO()):
+                lines = self.line_detector.detect_lines_in_bytes(image_data, self.cache)
+
+            image_id = str(uuid.uuid4())
+            logging.info(f"Detected {len(lines)} lines for image: {name} as {image_id}")
+            group.append((image_id, PipelineRunner.get_line_coordinates(lines)))
+
+            if len(group) >= self.group_size:
+                images_count += self.write_group(group)
+                group = []
+
+        if group:
+            images_count += self.write_group(group)
+        return images_count
+
+    def write_group(self, group):
+        load_shared_nodes(self.driver)
+        # angle_point_detector, the id of a line is its index
+        group = [
+            (image_id, lines, AnglePointsRepository.get_intersection_data(
+                image_id,
+                list(range(len(lines))),
+                PipelineRunner.get_coordinates_array(lines),
+                self.intersection_mode,
+                self.intersection_extension,
+            ))
+            for image_id, lines in group
+        ]
+        with self.driver.session() as session:
+            # The shared angle values are created before the group, which then only matches them
+            session.execute_write(
+                AnglePointsRepository.create_angle_values,
+                [data["angle"] for _, _, intersection_data in group for data in intersection_data],
+            )
+            contour_inputs = session.execute_write(self._write_images, group)
+
+            for image_id, intersection_data, vectors in contour_inputs:
+                try:
+                    if self.contour_engine == ContourAnalysisRepository.CONTOUR_ENGINE_MEMORY:
+                        session.execute_write(self._analyze_contour_in_memory, image_id, intersection_data, vectors)
+                    else:
+                        session.execute_write(self._analyze_contour, image_id)
+                except ValueError as e:
+                    # contour_analysis reports the images without a contour and goes on with the next ones
+                    logging.error(f"Error analyzing contour of image {image_id}: {e}")
+                finally:
+                    # The vectors of the image are counted even if the contour analysis fails
+                    session.execute_write(record_structural_elements, image_id, self.sketch_id)
+        return len(group)
+
+    def clean_up(self):
+        """Removes the lines of the processed images as the clean_up function does"""
+        self.clean_up_repository.cleanup()
+
+    def _write_images(self, tx, group):
+        """Writes the lines, angle points and vectors, returns the (image_id, intersection_data, vectors) of the images"""
+        return [
+            (image_id, intersection_data, self._write_image(tx, image_id, lines, intersection_data))
+            for image_id, lines, intersection_data in group
+        ]
+
+    def _write_image(self, tx, image_id, lines, intersection_data):
+        # line_detector
+        rows = LinesRepository.get_line_rows([[line] for line in lines], image_id)
+        LinesRepository.write_lines(tx, rows, self.lines_chunk_size)
+
+        # angle_point_detector
+        AnglePointsRepository.create_angle_points(tx, intersection_data, image_id)
+
+        # vector_characteristics_definer
+        vectors = None
+        if self.vector_construction == VectorCharacteristicsRepository.VECTOR_CONSTRUCTION_PYTHON:
+            line_angle_points = PipelineRunner.get_line_angle_points(rows, intersection_data)
+            vectors = VectorCharacteristicsRepository.build_vectors(image_id, line_angle_points)
+            VectorCharacteristicsRepository.write_vectors(tx, vectors, image_id)
+        else:
+            VectorCharacteristicsRepository.write_relative_characteristics(tx, image_id)
+        return vectors
+
+    def _analyze_contour(self, tx, image_id):
+        min_angle_point = find_starting_point(tx, image_id)
+        if min_angle_point is None:
+            logging.info(f"No angle points for image {image_id}, skipping contour analysis")
+            return
+        traverse_contour(tx, image_id, min_angle_point)
+        analyze_exposition(tx, image_id)
+
+    def _analyze_contour_in_memory(self, tx, image_id, intersection_data, vectors):
+        if vectors is None:
+            graph = load_contour_graph(tx, image_id)
+        else:
+            # The vectors built in memory are the ones just written, the graph isn't read back
+            angle_points = [
+                {"id": data["id"], "x": data["intersection"]["x"], "y": data["intersection"]["y"]}
+                for data in intersection_data
+            ]
+            graph = build_contour_graph(angle_points, vectors)
+
+        walk = walk_contour(graph)
+        if walk is None:
+            logging.info(f"No angle points for image {image_id}, skipping contour analysis")
+            return
+        write_contour(tx, walk)
+        analyze_exposition(tx, image_id, graph.get_vector_angle_points())
+
+    @staticmethod
+    def get_line_coordinates(lines):
+        """[x1, y1, x2, y2] of the detected lines as plain integers"""
+        return [[int(x1), int(y1), int(x2), int(y2)] for line in lines for x1, y1, x2, y2 in line]
+
+    @staticmethod
+    def get_line_angle_points(rows, intersection_data):
+        """Rows of VectorCharacteristicsRepository._retrieve_line_angle_points built from the data in memory"""
+        line_angles = {row["id"]: row["angle"] for row in rows}
+        line_angle_points = [
+            {"line_id": line_id, "angle": line_angles[line_id], "angle_point_id": data["id"],
+             "x": data["intersection"]["x"], "y": data["intersection"]["y"]}
+            for data in intersection_data
+            for line_id in (data["line1_id"], data["line2_id"])
+        ]
+        return sorted(line_angle_points, key=lambda row: (row["line_id"], row["angle_point_id"]))
+
+    @staticmethod
+    def get_coordinates_array(lines):
+        return np.array(lines, dtype=np.float64).reshape(-1, 4)
+
+
+def iter_folder_images(input_folder):
+    for image_file in sorted(glob.glob(os.path.join(input_folder, "*"))):
+        with open(image_file, "rb") as f:
+            yield image_file, f.read()
+
+
+def iter_generated_images(num_images, img_size, is_noised=False, curved_sides=False, zigzag_sides=False):
+    """Generates the triangle samples into a temporary directory and yields them"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        # The generator reports every saved folder
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_triangle_images(
+                output_dir,
+                num_images,
+                img_size,
+                is_noised=is_noised,
+                curved_sides=curved_sides,
+                zigzag_sides=zigzag_sides,
+                broken_sides=False,
+            )
+        yield from iter_folder_images(output_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the per-image pipeline in one process")
+    parser.add_argument('--input_folder', type=str, default="", help="Folder with the images to process")
+    parser.add_argument('--num_generated', type=int, default=0, help="Number of triangle samples to generate instead of the folder")
+    parser.add_argument('--img_size', type=int, default=512, help="Size of the generated samples in pixels")
+    parser.add_argument('--is_noised', action='store_true', help="Add other lines to the generated samples")
+    parser.add_argument('--neo4j_dsn', type=str, default=os.environ.get("NEO4J_DSN", "bolt://localhost:7687"))
+    parser.add_argument('--neo4j_user', type=str, default=os.environ.get("NEO4J_USER", "neo4j"))
+    parser.add_argument('--neo4j_pass', type=str, default=os.environ.get("NEO4J_PASS", ""))
+    parser.add_argument('--group_size', type=int, default=1, help="Number of images written in one transaction")
+    parser.add_argument('--clustering', type=str, default=HoughBundler.CLUSTERING_GREEDY,
+                        choices=[HoughBundler.CLUSTERING_GREEDY, HoughBundler.CLUSTERING_GRID],
+                        help="Strategy of merging detected segments into lines")
+    parser.add_argument('--intersection_mode', type=str, default=AnglePointsRepository.INTERSECTION_MODE_LINE,
+                        choices=[AnglePointsRepository.INTERSECTION_MODE_LINE, AnglePointsRepository.INTERSECTION_MODE_SEGMENT],
+                        help="Intersect every pair of lines or only the crossing segments")
+    parser.add_argument('--intersection_extension', type=float, default=10,
+                        help="Extension of the segments at both ends in pixels in the segment mode")
+    parser.add_argument('--vector_construction', type=str, default=VectorCharacteristicsRepository.VECTOR_CONSTRUCTION_PYTHON,
+                        choices=[VectorCharacteristicsRepository.VECTOR_CONSTRUCTION_CYPHER,
+                                 VectorCharacteristicsRepository.VECTOR_CONSTRUCTION_PYTHON],
+                        help="Build the vectors in the database or in Python")
+    parser.add_argument('--contour_engine', type=str, default=ContourAnalysisRepository.CONTOUR_ENGINE_MEMORY,
+                        choices=[ContourAnalysisRepository.CONTOUR_ENGINE_CYPHER, ContourAnalysisRepository.CONTOUR_ENGINE_MEMORY],
+                        help="Traverse the contour step by step in the database or in memory")
+    parser.add_argument('--detection_cache_path', type=str, default="", help="Directory of the on-disk cache of detected lines")
+    parser.add_argument('--detection_cache_max_size_mb', type=int, default=1024, help="Maximum size of the cache in MB")
+    parser.add_argument('--skip_clean_up', action='store_true', help="Keep the lines of the processed images")
+
+    args = parser.parse_args()
+
+    if not args.input_folder and not args.num_generated:
+        parser.error("Either --input_folder or --num_generated is required")
+
+    bootstrap_schema(args.neo4j_dsn, args.neo4j_user, args.neo4j_pass)
+
+    runner = PipelineRunner(
+        args.neo4j_dsn,
+        args.neo4j_user,
+        args.neo4j_pass,
+        LineDetector(clustering=args.clustering),
+        intersection_mode=args.intersection_mode,
+        intersection_extension=args.intersection_extension,
+        vector_construction=args.vector_construction,
+        contour_engine=args.contour_engine,
+        group_size=args.group_size,
+        cache=(
+            DetectionCache(args.detection_cache_path, args.detection_cache_max_size_mb * 1024 * 1024)
+            if args.detection_cache_path
+            else None
+        ),
+    )
+    try:
+        if args.input_folder:
+            images = iter_folder_images(args.input_folder)
+        else:
+            images = iter_generated_images(args.num_generated, args.img_size, is_noised=args.is_noised)
+
+        start = time.perf_counter()
+        images_count = runner.run(images)
+        if not args.skip_clean_up:
+            runner.clean_up()
+        print(f"Processed {images_count} images in {time.perf_counter() - start:.1f} s")
+    finally:
+        runner.close()
@@ -1,8 +1,10 @@
 """Generic Nuclio Handler Template"""
-import requests
 import traceback
 from pydantic_settings import BaseSettings
 
+from downstream_dispatcher import DownstreamDispatcher
+from schema_bootstrap import bootstrap_schema
+
 from post_processing_repository import PostProcessingRepository
 from post_processing_service import PostProcessingService
 
@@ -15,6 +17,13 @@ class Settings(BaseSettings):
     neo4j_user: str
     neo4j_pass: str
     next_nuclio: str = ""
+    # Timeout of the next function calls in seconds
+    next_nuclio_timeout: float = 600
+    # Don't wait for the responses of the next functions
+    next_nuclio_fire_and_forget: bool = False
+    next_nuclio_max_in_flight: int = 16
+    # Create the missing indexes and constraints of the graph database on start
+    schema_bootstrap: bool = True
 
 
 def init_context(context):
@@ -27,7 +36,20 @@ def init_context(context):
     context.logger.debug_with(
         f"Exporter initializing with:\n{Settings().model_dump()}", handler=HANDLER_NAME
     )
+    if Settings().schema_bootstrap:
+        bootstrap_schema(Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass)
+
     setattr(context.user_data, "next_nuclio", Settings().next_nuclio)
+    setattr(
+        context.user_data,
+        "downstream_dispatcher",
+        DownstreamDispatcher(
+            Settings().next_nuclio,
+            timeout=Settings().next_nuclio_timeout,
+            fire_and_forget=Settings().next_nuclio_fire_and_forget,
+            max_in_flight=Settings().next_nuclio_max_in_flight,
+        ),
+    )
     setattr(context.user_data, "post_processing_repository", PostProcessingRepository(Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass))
     setattr(context.user_data, "post_processing_service", PostProcessingService(context.user_data.post_processing_repository))
 
@@ -46,16 +68,9 @@ def http_handler(context, event):
 
         context.logger.info_with("Processed request successfully", handler=HANDLER_NAME)
 
-        next_functions_str = context.user_data.next_nuclio
-
-        if next_functions_str:
-            next_nuclio = next_functions_str.split(";")
-            context.logger.debug_with(f"Next functions: {next_nuclio}", handler=HANDLER_NAME)
-
-            if len(next_nuclio) > 0:
-                for func in next_nuclio:
-                    context.logger.info_with(f"Calling {func}", handler=HANDLER_NAME)
-                    requests.post(func, json=str(image_id))
+        next_payload = image_id if isinstance(image_id, list) else str(image_id)
+        for func, status_code in context.user_data.downstream_dispatcher.dispatch(next_payload):
+            context.logger.info_with(f"Response from {func}: {status_code}", handler=HANDLER_NAME)
         
         # Responding to the HTTP request
         context.Response(
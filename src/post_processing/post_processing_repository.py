@@ -84,13 +84,13 @@ class PostProcessingRepository:
         query = """
             CALL {
                 MATCH (n)
-                WHERE NOT n:Vector AND NOT n:AnglePoint
+                WHERE NOT n:Vector AND NOT n:AnglePoint AND NOT n:StructuralElementsSketch
                 WITH n.degreeScore AS degreeScore
                 RETURN apoc.agg.percentiles(degreeScore, [0.995])[0] AS thresholdDegreeScore
             }
             WITH thresholdDegreeScore
             MATCH (n)
-            WHERE NOT n:Vector AND NOT n:AnglePoint
+            WHERE NOT n:Vector AND NOT n:AnglePoint AND NOT n:StructuralElementsSketch
             AND n.degreeScore <= thresholdDegreeScore
             DETACH DELETE n
         """
@@ -0,0 +1,83 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logging.basicConfig(level=logging.INFO)
+
+
+class DownstreamDispatcher:
+    """Calls the next Nuclio functions of the pipeline.
+
+    Requests to all next functions are sent concurrently over a pooled keep-alive session,
+    so a stage waits for the slowest downstream function instead of the sum of all of them.
+    In the fire-and-forget mode the stage doesn't wait at all, the number of requests
+    in flight is bounded and new requests block until a slot is free.
+    """
+
+    def __init__(self, next_nuclio, timeout=None, fire_and_forget=False, max_in_flight=16):
+        """
+        Args:
+            next_nuclio: ";" separated URLs of the next functions
+            timeout: request timeout in seconds, None waits forever
+            fire_and_forget: return without waiting for the responses
+            max_in_flight: maximum number of requests sent at the same time
+        """
+        self.functions = [func for func in next_nuclio.split(";") if func] if next_nuclio else []
+        self.timeout = timeout
+        self.fire_and_forget = fire_and_forget
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(1, len(self.functions)), pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="downstream")
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+    def dispatch(self, payload=None):
+        """Posts the JSON payload to every next function, see dispatch_many"""
+        return self.dispatch_many([payload])
+
+    def dispatch_many(self, payloads):
+        """Posts every JSON payload to every next function.
+
+        Returns:
+            list of (function, status_code) tuples, status_code is None for failed requests.
+            Empty list in the fire-and-forget mode.
+        """
+        futures = [
+            (func, self._submit(func, payload))
+            for payload in payloads
+            for func in self.functions
+        ]
+        if self.fire_and_forget:
+            return []
+        return [(func, future.result()) for func, future in futures]
+
+    def _submit(self, func, payload):
+        # Blocks when max_in_flight requests are already sent
+        self.in_flight.acquire()
+        try:
+            future = self.executor.submit(self._post, func, payload)
+        except Exception:
+            self.in_flight.release()
+            raise
+        future.add_done_callback(lambda _: self.in_flight.release())
+        return future
+
+    def _post(self, func, payload):
+        try:
+            response = self.session.post(func, json=payload, timeout=self.timeout)
+            if not response.ok:
+                logging.error(f"Call to {func} failed with {response.status_code}: {response.text}")
+            return response.status_code
+        except Exception as e:
+            logging.error(f"Error calling {func}: {e}")
+            return None
@@ -8,7 +8,8 @@ from image_aggregator import do_intersect, extend_line, generate_curved_line_ext
     is_triangle_valid
 
 
-def generate_triangle_images(output_dir, num_images, img_size, is_noised, curved_sides, zigzag_sides, broken_sides):
+def generate_triangle_images(output_dir, num_images, img_size, is_noised, curved_sides, zigzag_sides, broken_sides,
+                             line_width=None):
     global curved_sides_num, zigzag_sides_num, straight_sides_num
     # Create the output directory if it doesn't exist
     if not os.path.exists(output_dir):
@@ -25,7 +26,7 @@ def generate_triangle_images(output_dir, num_images, img_size, is_noised, curved
         drawn_sides = []
 
         # Generate lines width
-        line_width = random.randint(1, 5)
+        image_line_width = line_width or random.randint(1, 5)
 
         curved_sides_num = 0
         zigzag_sides_num = 0
@@ -40,20 +41,20 @@ def generate_triangle_images(output_dir, num_images, img_size, is_noised, curved
 
         # Generate and draw curved sides
         for k in range(curved_sides_num):
-            draw_curved_side(draw, sides[k], line_width, img_size)
+            draw_curved_side(draw, sides[k], image_line_width, img_size)
             drawn_sides.append(sides[k])
 
         sides = [item for item in sides if item not in drawn_sides]
 
         # Generate and draw zigzag sides
         for m in range(zigzag_sides_num):
-            draw_zigzag_side(draw, sides[m], line_width, img_size)
+            draw_zigzag_side(draw, sides[m], image_line_width, img_size)
             drawn_sides.append(sides[m])
 
         sides = [item for item in sides if item not in drawn_sides]
 
         for n in range(broken_sides_num):
-            draw_broken_side(draw, sides[n], line_width)
+            draw_broken_side(draw, sides[n], image_line_width)
             drawn_sides.append(sides[n])
 
         sides = [item for item in sides if item not in drawn_sides]
@@ -62,7 +63,7 @@ def generate_triangle_images(output_dir, num_images, img_size, is_noised, curved
         for p in range(straight_sides_num):
             extended_start, extended_end = extend_line(sides[p][0], sides[p][1],
                                                        random.randint(round(img_size * 0.05), round(img_size * 0.3)))
-            draw.line([extended_start, extended_end], fill='white', width=line_width)
+            draw.line([extended_start, extended_end], fill='white', width=image_line_width)
 
         if is_noised:
             line_count = random.randint(0, 3)
@@ -153,8 +154,10 @@ if __name__ == "__main__":
                         help="Flag to allow zigzag polygons as triangle's sides")
     parser.add_argument('--broken_sides', type=bool, default=False,
                         help="Flag to allow broken triangle's sides")
+    parser.add_argument('--line_width', type=int, default=None,
+                        help="Width of the triangle's sides in pixels, random from 1 to 5 by default")
 
     args = parser.parse_args()
 
     generate_triangle_images(args.output_dir, args.num_images, args.img_size, args.is_noised, args.curved_sides,
-                             args.zigzag_sides, args.broken_sides)
+                             args.zigzag_sides, args.broken_sides, args.line_width)
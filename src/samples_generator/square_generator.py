@@ -4,7 +4,7 @@ import random
 from PIL import Image, ImageDraw
 
 
-def _generate_square(img_size):
+def _generate_square(img_size, line_width=None):
     img = Image.new("L", (img_size, img_size), color="black")
     draw = ImageDraw.Draw(img)
 
@@ -15,7 +15,7 @@ def _generate_square(img_size):
     )
     end_point = (start_point[0] + square_size, start_point[1] + square_size)
 
-    draw.rectangle([start_point, end_point], outline="white", width=img_size // 50)
+    draw.rectangle([start_point, end_point], outline="white", width=line_width or img_size // 50)
 
     # Add random rotation
     angle = random.randint(0, 360)
@@ -24,12 +24,12 @@ def _generate_square(img_size):
     return img
 
 
-def generate_square_samples(output_dir, num_images, img_size):
+def generate_square_samples(output_dir, num_images, img_size, line_width=None):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
     for i in range(num_images):
-        _generate_square(img_size).save(os.path.join(output_dir, f"square_{i}.png"))
+        _generate_square(img_size, line_width).save(os.path.join(output_dir, f"square_{i}.png"))
 
 
 if __name__ == "__main__":
@@ -46,7 +46,13 @@ if __name__ == "__main__":
         default="../../tests/generated_samples",
         help="Directory to save the generated images",
     )
+    parser.add_argument(
+        "--line_width",
+        type=int,
+        default=None,
+        help="Width of the square's sides in pixels, 1/50 of the image size by default",
+    )
 
     args = parser.parse_args()
 
-    generate_square_samples(args.output_dir, args.num_images, args.img_size)
+    generate_square_samples(args.output_dir, args.num_images, args.img_size, args.line_width)
@@ -1,11 +1,13 @@
 """Generic Nuclio Handler Template"""
-import requests
-import json
 import base64
 import traceback
 from nuclio_sdk import Event
 from pydantic_settings import BaseSettings
 
+from downstream_dispatcher import DownstreamDispatcher
+from schema_bootstrap import bootstrap_schema
+from stage_payload import get_next_payload, parse_stage_payload
+
 from relative_characteristics_repository import VectorCharacteristicsRepository
 
 HANDLER_NAME = "vector_characteristics_definer"
@@ -17,6 +19,15 @@ class Settings(BaseSettings):
     neo4j_user: str
     neo4j_pass: str
     next_nuclio: str = ""
+    # Timeout of the next function calls in seconds
+    next_nuclio_timeout: float = 600
+    # Don't wait for the responses of the next functions
+    next_nuclio_fire_and_forget: bool = False
+    next_nuclio_max_in_flight: int = 16
+    # Create the missing indexes and constraints of the graph database on start
+    schema_bootstrap: bool = True
+    # "cypher" builds the vectors in the database, "python" reads the angle points once and writes the built vectors
+    vector_construction: str = "cypher"
 
 
 def init_context(context):
@@ -30,10 +41,26 @@ def init_context(context):
         f"Exporter initializing with:\n{Settings().model_dump()}", handler=HANDLER_NAME
     )
     vector_characteristics_repository = VectorCharacteristicsRepository(
-        Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass
+        Settings().neo4j_dsn,
+        Settings().neo4j_user,
+        Settings().neo4j_pass,
+        vector_construction=Settings().vector_construction,
     )
     setattr(context.user_data, "vector_characteristics_repository", vector_characteristics_repository)
+    if Settings().schema_bootstrap:
+        bootstrap_schema(Settings().neo4j_dsn, Settings().neo4j_user, Settings().neo4j_pass)
+
     setattr(context.user_data, "next_nuclio", Settings().next_nuclio)
+    setattr(
+        context.user_data,
+        "downstream_dispatcher",
+        DownstreamDispatcher(
+            Settings().next_nuclio,
+            timeout=Settings().next_nuclio_timeout,
+            fire_and_forget=Settings().next_nuclio_fire_and_forget,
+            max_in_flight=Settings().next_nuclio_max_in_flight,
+        ),
+    )
 
     # Initialize and set context variables
     # Example: setattr(context.user_data, "example_variable", value)
@@ -47,22 +74,18 @@ def http_handler(context, event):
 
         image_id = event.body
         image_id = image_id.decode('utf-8') if isinstance(image_id, bytes) else image_id
+        # A batch of images arrives as a list, the vectors are built from the graph, the handed off lines aren't needed
+        images = parse_stage_payload(image_id)
 
-        context.user_data.vector_characteristics_repository.create_relative_characteristics(image_id)
+        for image_id_item, _ in images:
+            context.user_data.vector_characteristics_repository.create_relative_characteristics(image_id_item)
 
         context.logger.info_with(f"Processed request successfully", handler=HANDLER_NAME)
 
-        next_functions_str = context.user_data.next_nuclio
-
-        if next_functions_str:
-            next_nuclio = next_functions_str.split(";")
-            context.logger.debug_with(f"Next functions: {next_nuclio}", handler=HANDLER_NAME)
-
-            if len(next_nuclio) > 0:
-                for func in next_nuclio:
-                    context.logger.info_with(f"Calling {func}", handler=HANDLER_NAME)
-                    response = requests.post(func, json=str(image_id))
-                    context.logger.info_with(f"Response: {response.status_code}", handler=HANDLER_NAME)
+        # The next stages get only the image ids
+        next_payload = get_next_payload(image_id, [image_id_item for image_id_item, _ in images])
+        for func, status_code in context.user_data.downstream_dispatcher.dispatch(next_payload):
+            context.logger.info_with(f"Response from {func}: {status_code}", handler=HANDLER_NAME)
         
         # Responding to the HTTP request
         context.Response(
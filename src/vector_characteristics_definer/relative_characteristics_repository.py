@@ -1,4 +1,6 @@
+import itertools
 import logging
+import uuid
 
 from neo4j import GraphDatabase
 import numpy as np
@@ -6,8 +8,17 @@ import numpy as np
 logging.basicConfig(level=logging.INFO)
 
 class VectorCharacteristicsRepository:
-    def __init__(self, uri, user, password):
+    # Namespace of the vector ids derived from the image and the line
+    VECTOR_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_OID, "Vector")
+
+    # Vectors are built by a single Cypher statement matching every pair of angle points of a line
+    VECTOR_CONSTRUCTION_CYPHER = "cypher"
+    # Angle points of the lines are read once, vectors are built in Python and written in bulk
+    VECTOR_CONSTRUCTION_PYTHON = "python"
+
+    def __init__(self, uri, user, password, vector_construction=VECTOR_CONSTRUCTION_CYPHER):
         logging.info("Initializing VectorCharacteristicsRepository")
+        self.vector_construction = vector_construction
         try:
             self.driver = GraphDatabase.driver(uri, auth=(user, password))
             logging.info("Database connection established")
@@ -25,18 +36,25 @@ class VectorCharacteristicsRepository:
             raise
 
     def create_relative_characteristics(self, image_id):
+        """Creates the vectors of the image
+
+        Args:
+            image_id: id of the image
+        """
         logging.info("Creating relative characteristics")
         with self.driver.session() as session:
-            session.write_transaction(self._create_relative_characteristics, image_id)
-            line_endpoints = session.read_transaction(self._retrieve_line_endpoints, image_id)
-            for data in line_endpoints:
-                angle = self.calculate_angle(*data["coordinates"])
-                session.write_transaction(self._update_angle, data["line1_id"], data["line2_id"], angle)
-            logging.debug("Transaction for _create_relative_characteristics completed")
+            if self.vector_construction == VectorCharacteristicsRepository.VECTOR_CONSTRUCTION_PYTHON:
+                line_angle_points = session.read_transaction(self._retrieve_line_angle_points, image_id)
+                vectors = self.build_vectors(image_id, line_angle_points)
+                session.write_transaction(self.write_vectors, vectors, image_id)
+            else:
+                session.write_transaction(self.write_relative_characteristics, image_id)
+            logging.debug("Transaction for write_relative_characteristics completed")
 
     @staticmethod
-    def _create_relative_characteristics(tx, image_id):
-        logging.debug("Running _create_relative_characteristics transaction")
+    def write_relative_characteristics(tx, image_id):
+        """Creates the vectors of the image from its lines and angle points in the transaction"""
+        logging.debug("Running write_relative_characteristics transaction")
         query = """
             MATCH (coord:Coordinates)--(:Location)--(line:Line {image_id: $image_id})-[:HAS_ANGLE_POINT]->(ap1:AnglePoint)--(apLoc1:AnglePointCoordinates),
                 (line)-[:HAS_ANGLE_POINT]->(ap2:AnglePoint)--(apLoc2:AnglePointCoordinates),
@@ -60,69 +78,82 @@ class VectorCharacteristicsRepository:
         tx.run(query, image_id=image_id)
     
     @staticmethod
-    def _update_angle(tx, vector1_id, vector2_id, angle):
-        query = """
-            MATCH (v1:Vector {id: $vector1_id})-[:HAS_ANGLE_POINT]->(ap:AnglePoint)<-[:HAS_ANGLE_POINT]-(v2:Vector {id: $vector2_id})
-            MATCH (ap)-[:HAS_ANGLE]->(apLoc:AnglePointAngle)
-            SET apLoc.angle = $angle
-        """
-        tx.run(query, vector1_id=vector1_id, vector2_id=vector2_id, angle=angle)
-    
-    @staticmethod
-    def _retrieve_line_endpoints(tx, image_id):
+    def _retrieve_line_angle_points(tx, image_id):
+        """Returns the angle points of every line of the image with the angle of the line, ordered by line"""
         query = """
-            MATCH (l1:Line {image_id: $image_id})-[:HAS_LOCATION]->(:Location)-[:HAS_COORDINATES]->(coord1:Coordinates),
-                (l2:Line {image_id: $image_id})-[:HAS_LOCATION]->(:Location)-[:HAS_COORDINATES]->(coord2:Coordinates)
-            WHERE l1 <> l2
-            RETURN l1.id AS line1_id, coord1.x1 AS x1, coord1.y1 AS y1, coord1.x2 AS x2, coord1.y2 AS y2,
-                l2.id AS line2_id, coord2.x1 AS x3, coord2.y1 AS y3, coord2.x2 AS x4, coord2.y2 AS y4
+            MATCH (angle:Angle)<-[:HAS_ANGLE]-(:Orientation)<-[:HAS_ORIENTATION]-(line:Line {image_id: $image_id}),
+                (line)-[:HAS_ANGLE_POINT]->(ap:AnglePoint)-[:HAS_COORDINATES]->(apLoc:AnglePointCoordinates)
+            RETURN line.id AS line_id, angle.value AS angle, ap.id AS angle_point_id, apLoc.x AS x, apLoc.y AS y
+            ORDER BY line_id, angle_point_id
         """
-        results = []
-        for record in tx.run(query, image_id=image_id):
-            results.append({
-                "line1_id": record["line1_id"],
-                "line2_id": record["line2_id"],
-                "coordinates": [record["x1"], record["y1"], record["x2"], record["y2"], record["x3"], record["y3"], record["x4"], record["y4"]]
-            })
-        return results
-    
+        return [record.data() for record in tx.run(query, image_id=image_id)]
+
     @staticmethod
-    def calculate_angle(x1, y1, x2, y2, x3, y3, x4, y4):
-        """
-        Calculate the angle between two lines given their endpoints.
+    def build_vectors(image_id, line_angle_points):
+        """Builds the vectors which write_relative_characteristics creates in Cypher.
 
-        Args:
-        x1, y1: Coordinates of the first point of the first line.
-        x2, y2: Coordinates of the second point of the first line.
-        x3, y3: Coordinates of the first point of the second line.
-        x4, y4: Coordinates of the second point of the second line.
+        A line becomes a vector if it has angle points at different places. The vector is connected
+        to those angle points, and every pair of them is a segment with its coordinates and magnitude.
+        Each pair is listed once, starting at the point with the smaller (x, y).
 
-        Returns:
-        angle: The angle between the two lines in degrees.
+        Args:
+            image_id: id of the image
+            line_angle_points: rows of _retrieve_line_angle_points
         """
+        vectors = []
+        for line_id, rows in itertools.groupby(line_angle_points, key=lambda row: row["line_id"]):
+            rows = list(rows)
+            points = np.array([[row["x"], row["y"]] for row in rows])
+            first, second = np.triu_indices(len(rows), k=1)
+            distinct = np.any(points[first] != points[second], axis=1)
+            first, second = first[distinct], second[distinct]
+            if len(first) == 0:
+                continue
+
+            swap = (points[first, 0] > points[second, 0]) | (
+                (points[first, 0] == points[second, 0]) & (points[first, 1] > points[second, 1])
+            )
+            starts = np.where(swap[:, None], points[second], points[first])
+            ends = np.where(swap[:, None], points[first], points[second])
+            # Angle points of different lines can share a place, their segments are the same
+            segments = np.unique(np.hstack([starts, ends]), axis=0)
+            deltas = segments[:, 2:4] - segments[:, 0:2]
+            magnitudes = np.sqrt((deltas * deltas).sum(axis=1))
+
+            vectors.append({
+                "line_id": line_id,
+                "vector_id": str(uuid.uuid5(VectorCharacteristicsRepository.VECTOR_NAMESPACE, f"{image_id}/{line_id}")),
+                "angle": rows[0]["angle"],
+                "angle_point_ids": sorted({rows[i]["angle_point_id"] for i in np.concatenate([first, second]).tolist()}),
+                "segments": [
+                    {"x1": x1, "y1": y1, "x2": x2, "y2": y2, "magnitude": magnitude}
+                    for (x1, y1, x2, y2), magnitude in zip(segments.tolist(), magnitudes.tolist())
+                ],
+            })
+        return vectors
 
-        # Convert points to vectors
-        vector1 = np.array([x2 - x1, y2 - y1])
-        vector2 = np.array([x4 - x3, y4 - y3])
-
-        # Calculate the dot product
-        dot_product = np.dot(vector1, vector2)
-
-        # Calculate the magnitudes of the vectors
-        magnitude_v1 = np.linalg.norm(vector1)
-        magnitude_v2 = np.linalg.norm(vector2)
-
-        # Avoid division by zero
-        if magnitude_v1 == 0 or magnitude_v2 == 0:
-            return 0
-
-        # Calculate the cosine of the angle
-        cos_angle = dot_product / (magnitude_v1 * magnitude_v2)
-
-        # Make sure the cosine value is in the range [-1, 1] to avoid NaN results
-        cos_angle = max(min(cos_angle, 1), -1)
+    @staticmethod
+    def write_vectors(tx, vectors, image_id):
+        """Creates the vectors of build_vectors in the transaction"""
+        query = """
+            UNWIND $vectors AS vector
+            MATCH (line:Line {id: vector.line_id, image_id: $image_id})
+            MERGE (v:Vector {line_id: vector.line_id, image_id: $image_id})
+            ON CREATE SET v.vector_id = vector.vector_id
+            MERGE (line)-[:IS_VECTOR]->(v)
+            MERGE (vAngle:VectorAngle {value: vector.angle})
+            MERGE (vAngle)<-[:HAS_VECTOR_ANGLE]-(v)
 
-        # Calculate the angle in radians and then convert to degrees
-        angle = np.degrees(np.arccos(cos_angle))
+            WITH v, vector
+            UNWIND vector.angle_point_ids AS angle_point_id
+            MATCH (ap:AnglePoint {id: angle_point_id})
+            MERGE (v)-[:HAS_ANGLE_POINT]->(ap)
 
-        return angle
\ No newline at end of file
+            WITH DISTINCT v, vector
+            UNWIND vector.segments AS segment
+            MERGE (vCoordinates:VectorCoordinates {x1: segment.x1, y1: segment.y1, x2: segment.x2, y2: segment.y2})
+            MERGE (v)-[:HAS_VECTOR_COORDINATES]->(vCoordinates)
+            MERGE (vectorMagnitude:VectorMagnitude {value: segment.magnitude})
+            MERGE (vectorMagnitude)<-[:HAS_MAGNITUDE]-(v)
+        """
+        tx.run(query, vectors=vectors, image_id=image_id)
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import numpy as np
+
+# The functions are deployed from their own directories and import their modules by name
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "line_detector"))
+
+from detection_cache import DetectionCache  # noqa: E402
+
+
+def test_get_returns_lines_evicted_after_reading(tmp_path, monkeypatch):
+    cache = DetectionCache(str(tmp_path), 1024 * 1024)
+    cache.put("ab" * 32, "digest", [[[0, 0, 10, 10]]])
+
+    def evicted(path, *args, **kwargs):
+        raise FileNotFoundError(path)
+
+    # Another process removes the entry between np.load and os.utime
+    monkeypatch.setattr(os, "utime", evicted)
+    lines = cache.get("ab" * 32, "digest")
+
+    assert np.array_equal(lines, [[[0, 0, 10, 10]]])
+
+
+def test_get_returns_none_for_missing_entry(tmp_path):
+    cache = DetectionCache(str(tmp_path), 1024 * 1024)
+
+    assert cache.get("ab" * 32, "digest") is None
@@ -0,0 +1,59 @@
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+
+# The functions are deployed from their own directories and import their modules by name
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "line_detector"))
+
+from hough_builder import HoughBundler  # noqa: E402
+
+
+def generate_lines(num_lines, img_size, seed=0):
+    """Bundles of jittered segments around a few strokes, as process_lines passes them to the grouping"""
+    rng = np.random.default_rng(seed)
+    strokes = rng.integers(0, img_size, size=(max(1, num_lines // 20), 4))
+    jitter = rng.integers(-3, 4, size=(num_lines, 4))
+    lines = strokes[rng.integers(0, len(strokes), size=num_lines)] + jitter
+    return list(np.clip(lines, 0, img_size - 1).astype(np.float64))
+
+
+def get_group_lines(groups):
+    return [[line.ravel().tolist() for line in group] for group in groups]
+
+
+def test_vectorized_grouping_matches_scalar():
+    lines = generate_lines(300, 512)
+
+    scalar_groups = HoughBundler(min_distance=10, min_angle=10, vectorized=False).merge_lines_into_groups(lines)
+    vectorized_groups = HoughBundler(min_distance=10, min_angle=10, vectorized=True).merge_lines_into_groups(lines)
+
+    assert get_group_lines(vectorized_groups) == get_group_lines(scalar_groups)
+
+
+def test_vectorized_grouping_matches_scalar_across_blocks():
+    lines = generate_lines(300, 512)
+    bundler = HoughBundler(min_distance=10, min_angle=10, vectorized=True)
+    # A few rows per block, so the groups are built across many blocks
+    bundler.DISTANCE_BLOCK_SIZE = 1000
+
+    scalar_groups = HoughBundler(min_distance=10, min_angle=10, vectorized=False).merge_lines_into_groups(lines)
+
+    assert get_group_lines(bundler.merge_lines_into_groups(lines)) == get_group_lines(scalar_groups)
+
+
+def test_vectorized_grouping_memory_is_bounded():
+    num_lines = 6000
+    lines = generate_lines(num_lines, 4096)
+    full_matrix_size = num_lines * num_lines * np.dtype(np.float64).itemsize
+
+    tracemalloc.start()
+    try:
+        HoughBundler(min_distance=10, min_angle=10, vectorized=True).merge_lines_into_groups(lines)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # A single n x n distance matrix takes 288 MB
+    assert peak < full_matrix_size / 4